@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""End-to-end audio -> score benchmark with per-stage timings.
+
+    python benchmarks/pipeline.py --save benchmarks/baseline.json
+    python benchmarks/pipeline.py --compare benchmarks/baseline.json
+    python benchmarks/pipeline.py --check-parity [recordings ...]
+
+Synthetic cough-like WAV fixtures of several lengths and sample rates are
+written to a temporary directory and scored by a randomly initialised copy of
+the production CNN, so the run is fully offline and CPU-only. Reported are
+median per-stage latency, end-to-end throughput for the rendered JPEG path and
+the in-memory tensor path, and peak RSS. ``--compare`` exits non-zero when a
+stage got slower than the baseline by more than ``--threshold``.
+``--check-parity`` instead compares the match rates of the two paths per file,
+on the given recordings with the production model or on the fixtures with the
+random one, and exits non-zero when a file differs by more than
+``--tolerance`` points or fails either path.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "-1")
+os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import cv2
+import numpy as np
+import soundfile as sf
+
+from core.inference import KerasBackend, check_spectrogram_parity, iter_predictions
+from core.network import build_model
+from core.spectrogram import (CMAP, compute_magnitude, amplitude_to_db, load_audio,
+                              preprocess_image, spectrogram_to_tensor)
+
+DURATIONS = (1.0, 5.0, 30.0)
+SAMPLE_RATES = (8000, 22050, 48000)
+BATCH_SIZE = 32
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024) if platform.system() == "Darwin" else rss / 1024
+
+def make_fixture(path, seconds, sr, seed=0):
+    """Noise floor with a few decaying broadband bursts, roughly like coughs"""
+    rng = np.random.default_rng(seed)
+    n = int(seconds * sr)
+    y = 0.01 * rng.standard_normal(n)
+    t = np.arange(int(0.3 * sr)) / sr
+    burst = np.exp(-t * 12) * rng.standard_normal(len(t))
+    for start in rng.integers(0, max(1, n - len(t)), size=max(1, int(seconds))):
+        seg = y[start:start + len(t)]
+        seg += 0.5 * burst[:len(seg)]
+    sf.write(path, y.astype(np.float32), sr)
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - start
+
+def render_canvas(db):
+    """matplotlib draw of the spectrogram, as render_spectrogram does before saving"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import librosa.display
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    fig = Figure()
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    librosa.display.specshow(db, ax=ax, cmap=CMAP)
+    ax.axis('off')
+    fig.tight_layout(pad=0)
+    canvas.draw()
+    return np.asarray(canvas.buffer_rgba())[:, :, :3]
+
+def run_fixture(path, workdir, backend, repeat):
+    stages = {k: [] for k in ("load", "stft", "db", "render", "jpeg_write",
+                              "imread_resize", "tensor", "predict_single")}
+    tensor = None
+    for _ in range(repeat):
+        (y, sr), t = timed(load_audio, path); stages["load"].append(t)
+        mag, t = timed(compute_magnitude, y); stages["stft"].append(t)
+        db, t = timed(amplitude_to_db, mag); stages["db"].append(t)
+        rgb, t = timed(render_canvas, db); stages["render"].append(t)
+        img_path = os.path.join(workdir, os.path.basename(path) + ".jpg")
+        _, t = timed(cv2.imwrite, img_path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR)); stages["jpeg_write"].append(t)
+        _, t = timed(preprocess_image, img_path); stages["imread_resize"].append(t)
+        tensor, t = timed(spectrogram_to_tensor, db); stages["tensor"].append(t)
+        _, t = timed(backend.predict, tensor[np.newaxis]); stages["predict_single"].append(t)
+    return {k: statistics.median(v) * 1000 for k, v in stages.items()}, tensor
+
+def run(repeat=3, batch_samples=64):
+    results = {"fixtures": {}, "throughput": {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        model_path = os.path.join(workdir, "bench_model.h5")
+        build_model().save(model_path)
+        backend = KerasBackend(model_path)
+        # Lazy imports, numba JIT and tf.function tracing are not part of the measurement
+        warmup = os.path.join(workdir, "warmup.wav")
+        make_fixture(warmup, 1.0, SAMPLE_RATES[0])
+        run_fixture(warmup, workdir, backend, 1)
+
+        tensor_inputs = []
+        for seconds in DURATIONS:
+            for sr in SAMPLE_RATES:
+                name = f"{seconds:g}s@{sr}"
+                path = os.path.join(workdir, f"fixture_{seconds:g}s_{sr}.wav")
+                make_fixture(path, seconds, sr)
+                start = time.perf_counter()
+                stages, tensor = run_fixture(path, workdir, backend, repeat)
+                stages["total_s"] = (time.perf_counter() - start) / repeat
+                results["fixtures"][name] = stages
+                tensor_inputs.append(tensor)
+                print(f"{name:>12}  " + "  ".join(f"{k} {v:7.2f}ms" for k, v in stages.items() if k != "total_s"))
+
+        batch = (tensor_inputs * (batch_samples // len(tensor_inputs) + 1))[:batch_samples]
+        start = time.perf_counter()
+        for _ in iter_predictions(batch, BATCH_SIZE, backend):
+            pass
+        results["throughput"]["predict_batched"] = batch_samples / (time.perf_counter() - start)
+
+        fixtures = results["fixtures"].values()
+        rendered_ms = statistics.mean(sum(f[k] for k in ("load", "stft", "db", "render", "jpeg_write",
+                                                         "imread_resize", "predict_single")) for f in fixtures)
+        direct_ms = statistics.mean(sum(f[k] for k in ("load", "stft", "db", "tensor", "predict_single"))
+                                    for f in fixtures)
+        results["throughput"]["rendered_path"] = 1000 / rendered_ms
+        results["throughput"]["tensor_path"] = 1000 / direct_ms
+    results["peak_rss_mb"] = peak_rss_mb()
+    for k, v in results["throughput"].items():
+        print(f"{k:>16}  {v:8.1f} samples/s")
+    if results["peak_rss_mb"]:
+        print(f"{'peak RSS':>16}  {results['peak_rss_mb']:8.1f} MB")
+    return results
+
+def check_parity(paths, tolerance):
+    """Prints the rendered vs in-memory match-rate delta per file; returns whether all pass"""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        backend = None
+        if not paths:
+            model_path = os.path.join(workdir, "bench_model.h5")
+            build_model().save(model_path)
+            backend = KerasBackend(model_path)
+            for seconds in DURATIONS:
+                for sr in SAMPLE_RATES:
+                    path = os.path.join(workdir, f"fixture_{seconds:g}s_{sr}.wav")
+                    make_fixture(path, seconds, sr)
+                    paths.append(path)
+            # rendered JPEGs go to data/ under the working directory
+            os.chdir(workdir)
+        try:
+            passed, deltas = check_spectrogram_parity(paths, tolerance, backend)
+        finally:
+            os.chdir(cwd)
+    for path, delta in zip(paths, deltas):
+        print(f"{os.path.basename(path):>28}  " + ("FAILED" if delta is None else f"{delta:6.3f} points"))
+    print("parity " + ("ok" if passed else f"FAILED (tolerance {tolerance:g} points)"))
+    return passed
+
+def compare(results, baseline, threshold):
+    """Lists stages that got slower (or throughputs that dropped) by more than ``threshold``"""
+    regressions = []
+    for name, stages in results["fixtures"].items():
+        for stage, value in stages.items():
+            old = baseline.get("fixtures", {}).get(name, {}).get(stage)
+            if old and value > old * (1 + threshold):
+                regressions.append(f"{name} {stage}: {old:.2f} -> {value:.2f}")
+    for label, value in results["throughput"].items():
+        old = baseline.get("throughput", {}).get(label)
+        if old and value < old * (1 - threshold):
+            regressions.append(f"{label}: {old:.1f} -> {value:.1f} samples/s")
+    return regressions
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="runs per fixture, median reported")
+    parser.add_argument("--save", metavar="JSON", help="write results as the new baseline")
+    parser.add_argument("--compare", metavar="JSON", help="baseline to check against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative slowdown")
+    parser.add_argument("--check-parity", nargs="*", metavar="AUDIO",
+                        help="compare rendered and in-memory match rates (default: the fixtures)")
+    parser.add_argument("--tolerance", type=float, default=2.0, help="allowed parity delta in points")
+    args = parser.parse_args(argv)
+
+    if args.check_parity is not None:
+        return 0 if check_parity(args.check_parity, args.tolerance) else 1
+    results = run(args.repeat)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print("REGRESSION", line)
+        return 1 if regressions else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Cold-start benchmark: time-to-first-window and time-to-first-prediction.
+
+    python benchmarks/startup.py --repeat 5
+
+Every measurement runs in a fresh interpreter so module caches don't hide
+import cost. Times are wall clock from process launch, as a clinician would
+experience them. Set QT_QPA_PLATFORM=offscreen to run on a headless host.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_WINDOW = """
+from PyQt5 import QtWidgets
+app = QtWidgets.QApplication([])
+from ui.window import ModernWindow
+window = ModernWindow()
+window.show()
+app.processEvents()
+print("ready", flush=True)
+import os; os._exit(0)
+"""
+
+FIRST_PREDICTION = """
+import numpy as np
+from core.inference import predict_batch
+predict_batch([np.zeros((224, 224, 3), np.float32)])
+print("ready", flush=True)
+"""
+
+IMPORTS = {
+    "core.audio": "import core.audio; print('ready', flush=True)",
+    "core.model": "import core.model; print('ready', flush=True)",
+    "ui.window": "import ui.window; print('ready', flush=True)",
+}
+
+def time_to_ready(code):
+    """Seconds from launching a fresh interpreter until it prints 'ready'"""
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, "-c", code], cwd=ROOT, stdout=subprocess.PIPE,
+                            stderr=subprocess.DEVNULL, text=True)
+    for line in proc.stdout:
+        if line.strip() == "ready":
+            elapsed = time.perf_counter() - start
+            break
+    else:
+        elapsed = None
+    proc.stdout.close()
+    proc.wait()
+    return elapsed
+
+def measure(code, repeat):
+    runs = [time_to_ready(code) for _ in range(repeat)]
+    if None in runs:
+        return None
+    return {"median": statistics.median(runs), "min": min(runs), "max": max(runs)}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", help="also write results to this file")
+    args = parser.parse_args(argv)
+
+    cases = {f"import {name}": code for name, code in IMPORTS.items()}
+    cases["first window"] = FIRST_WINDOW
+    if os.path.exists(os.path.join(ROOT, "models", "best_mod.h5")):
+        cases["first prediction"] = FIRST_PREDICTION
+    else:
+        print("models/best_mod.h5 not found, skipping first prediction")
+
+    results = {}
+    for name, code in cases.items():
+        results[name] = measure(code, args.repeat)
+        r = results[name]
+        print(f"{name:<22} " + ("failed" if r is None else
+              f"median {r['median']:.3f}s  min {r['min']:.3f}s  max {r['max']:.3f}s"))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
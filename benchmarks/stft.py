@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""STFT -> dB throughput: per-file librosa vs the batched float32 engine.
+
+    python benchmarks/stft.py --clips 512 --min-seconds 0.3 --max-seconds 2
+
+Synthetic cough-like clips at ``TARGET_SR`` (22050 Hz if unset) are converted three
+ways: the librosa reference one clip at a time, the engine one clip at a time,
+and the engine in batches. The run fails when the engine drifts from librosa
+by more than ``--tolerance`` dB.
+"""
+
+import argparse
+import os
+import sys
+import time
+import warnings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+
+from core.decode import TARGET_SR
+from core.spectrogram import HOP_LENGTH, N_FFT, TOP_DB
+from core.stft import StftEngine, check_parity, librosa_db
+
+def make_clips(n, min_seconds, max_seconds, sr, seed=0):
+    """Noise floor with one decaying broadband burst per clip"""
+    rng = np.random.default_rng(seed)
+    clips = []
+    for seconds in rng.uniform(min_seconds, max_seconds, n):
+        y = 0.01 * rng.standard_normal(int(seconds * sr))
+        t = np.arange(min(len(y), int(0.3 * sr))) / sr
+        start = rng.integers(0, max(1, len(y) - len(t)))
+        y[start:start + len(t)] += 0.5 * np.exp(-t * 12) * rng.standard_normal(len(t))
+        clips.append(y.astype(np.float32))
+    return clips
+
+def timed(fn, repeat):
+    fn()  # warm-up: imports, FFT plans, JIT
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clips", type=int, default=512)
+    parser.add_argument("--min-seconds", type=float, default=0.3)
+    parser.add_argument("--max-seconds", type=float, default=2.0)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per variant, best reported")
+    parser.add_argument("--numba", action="store_true", help="use the Numba dB kernel")
+    parser.add_argument("--tolerance", type=float, default=0.05, help="max dB difference to librosa")
+    args = parser.parse_args(argv)
+
+    sr = TARGET_SR or 22050
+    clips = make_clips(args.clips, args.min_seconds, args.max_seconds, sr)
+    engine = StftEngine(N_FFT, HOP_LENGTH, TOP_DB, use_numba=args.numba)
+    audio_seconds = sum(len(y) for y in clips) / sr
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")  # librosa warns about clips shorter than n_fft
+        worst = check_parity(engine, clips[:64], args.tolerance)
+        reference = timed(lambda: [librosa_db(y, N_FFT, HOP_LENGTH, TOP_DB) for y in clips], args.repeat)
+    single = timed(lambda: [engine.db(y) for y in clips], args.repeat)
+    batched = timed(lambda: engine.batch_db(clips), args.repeat)
+
+    print(f"{args.clips} clips, {audio_seconds:.0f} s of audio at {sr} Hz, max |diff| {worst:.4f} dB")
+    for name, seconds in (("librosa per file", reference), ("engine per file", single),
+                          ("engine batched", batched)):
+        print(f"{name:<18} {seconds * 1000:8.1f} ms  {audio_seconds / seconds:8.0f}x realtime"
+              f"  {reference / seconds:5.1f}x vs librosa")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,97 +1,62 @@
 # -*- coding: utf-8 -*-
 
 import os
-import numpy as np
-import sounddevice as sd
-import soundfile as sf
-import librosa
-import librosa.display
-import matplotlib
-from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
-from scipy.io import wavfile
-from PyQt5.QtCore import QThread, pyqtSignal
+import time
+from PyQt5.QtCore import pyqtSignal
 
-matplotlib.use('Agg')
+from core.spectrogram import (N_FFT, HOP_LENGTH, CMAP, IMG_SIZE, STFT_PARAMS, TRIM_SILENCE,
+                              load_audio, trim_silence, active_regions, compute_spectrogram_db,
+                              render_spectrogram, spectrogram_to_tensor, load_spectrogram_db,
+                              get_cache, generate_spectrogram, generate_spectrogram_tensor)
+from core.live import LIVE_SR, LIVE_WINDOW_SECONDS, LiveAnalyzer
+from core.scheduler import LIVE
+from core.tasks import ScheduledTask
 
-def generate_spectrogram(file_path):
-    """Heavy STFT processing logic separated for thread usage"""
-    try:
-        # Use librosa.load for broad format support (mp3, m4a, wav, etc.)
-        y, sr = librosa.load(file_path, sr=None)
-        
-        if len(y.shape) > 1:
-            y = np.mean(y, axis=1)
-            
-        window_size = 1024
-        window = np.hanning(window_size)
-        stft = librosa.stft(y, n_fft=window_size, hop_length=512, window=window)
-        out = 2 * np.abs(stft) / np.sum(window)
-        
-        fig = matplotlib.figure.Figure()
-        canvas = FigureCanvas(fig)
-        ax = fig.add_subplot(111)
-        librosa.display.specshow(librosa.amplitude_to_db(out, ref=np.max), ax=ax, cmap="nipy_spectral")
-        ax.axis('off')
-        fig.tight_layout(pad=0)
-        
-        if not os.path.exists("data"):
-            os.makedirs("data")
-            
-        output_img = os.path.join("data", os.path.basename(file_path) + ".jpg")
-        fig.savefig(output_img, bbox_inches='tight', pad_inches=0)
-        return output_img
-    except Exception as e:
-        raise e
+RECORD_SECONDS = 3.0
 
 # Alias for backward compatibility
 processing = generate_spectrogram
 
-class ProcessThread(QThread):
-    """Thread for processing existing audio files to spectrograms"""
-    finished = pyqtSignal(str, str)
-    error = pyqtSignal(str)
-
-    def __init__(self, audio_paths):
-        super().__init__()
-        self.audio_paths = audio_paths
-
-    def run(self):
-        try:
-            for path in self.audio_paths:
-                img_path = generate_spectrogram(path)
-                self.finished.emit(img_path, path)
-        except Exception as e:
-            self.error.emit(str(e))
+class RecordThread(ScheduledTask):
+    """Records a clinical sample, by default with live streaming analysis.
 
-class RecordThread(QThread):
-    """Improved RecordThread with non-blocking processing"""
+    In live mode audio is captured through a ``sounddevice.InputStream`` and a
+    rolling score is emitted through ``live_score`` while recording; otherwise a
+    blocking ``sd.rec`` is used. Progress reflects the samples actually captured.
+    Runs at ``LIVE`` priority, ahead of any queued analysis or conversion.
+    Without a reachable model the recording still completes and
+    ``live_unavailable`` says why no rolling score was shown.
+    """
+    priority = LIVE
     finished = pyqtSignal(str, str)
     progress = pyqtSignal(int)
+    live_score = pyqtSignal(float, float) # seconds recorded, match rate
+    live_unavailable = pyqtSignal(str)
     error = pyqtSignal(str)
 
-    def __init__(self, filename):
-        super().__init__()
+    def __init__(self, filename, seconds=RECORD_SECONDS, live=True, scheduler=None):
+        super().__init__(scheduler)
         self.filename = filename
+        self.seconds = seconds
+        self.live = live
 
     def run(self):
         try:
-            fs = 44100
-            seconds = 3
-            
-            # Start recording
-            myrecording = sd.rec(int(seconds * fs), samplerate=fs, channels=1)
-            
-            # Progress updates
-            steps = 30
-            for i in range(steps):
-                self.msleep(100) 
-                self.progress.emit(int((i + 1) / steps * 100))
-            
-            sd.wait()
+            from scipy.io import wavfile
+
+            if self.live:
+                fs = LIVE_SR
+                analyzer = LiveAnalyzer(fs, max_seconds=self.seconds + 1,
+                                        window_seconds=min(self.seconds, LIVE_WINDOW_SECONDS))
+                myrecording = analyzer.record(
+                    self.seconds, on_progress=lambda f: self.progress.emit(int(f * 100)),
+                    on_score=self.live_score.emit, should_stop=self.isInterruptionRequested)
+                if analyzer.score_error:
+                    self.live_unavailable.emit(analyzer.score_error)
+            else:
+                myrecording, fs = self._record_blocking()
             
-            if not os.path.exists("data"):
-                os.makedirs("data")
-                
+            os.makedirs("data", exist_ok=True)
             wav_path = os.path.join("data", self.filename + ".wav")
             wavfile.write(wav_path, fs, myrecording)
             
@@ -100,3 +65,17 @@ class RecordThread(QThread):
             self.finished.emit(img_path, wav_path)
         except Exception as e:
             self.error.emit(str(e))
+
+    def _record_blocking(self):
+        import sounddevice as sd
+
+        fs = 44100
+        frames = int(self.seconds * fs)
+        myrecording = sd.rec(frames, samplerate=fs, channels=1)
+        start = time.monotonic()
+        while (elapsed := time.monotonic() - start) < self.seconds:
+            self.msleep(100)
+            self.progress.emit(min(100, int(elapsed / self.seconds * 100)))
+        sd.wait()
+        self.progress.emit(100)
+        return myrecording, fs
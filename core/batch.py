@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""Headless batch screening without the Qt wizard.
+
+    python -m core.batch in_dir/ --out results.csv
+
+Walks ``in_dir`` for audio files and spectrogram images, converts them in a
+process pool while the main process scores finished samples in batches, and
+appends one row per file to a CSV or JSONL output. Files already scored in
+the output are skipped, so an interrupted run can simply be restarted; files
+that failed are tried again and get a new row, the last row per file being
+the current one. Files scored before by the same model are answered from
+the score store without being converted at all. With silence trimming enabled
+(``COVID_TRIM_SILENCE``) each row also records the seconds trimmed.
+
+Recordings longer than ``--stream-seconds`` (default 5 minutes) are converted
+with the streaming STFT instead of being decoded whole; ``--stream`` does that
+for every recording. Their spectrogram is averaged down in time, so streamed
+scores are kept out of the score store.
+
+    python -m core.batch in_dir/ --out segments.jsonl --segments
+
+scores every recording window by window instead and writes the aggregates
+(``mean``, ``max``, ``top_k_mean``, reported as ``match_rate``) together with
+the per-window ``timeline``.
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from core import profiling
+from core.decode import audio_length
+from core.inference import DEFAULT_BATCH_SIZE, iter_predictions
+from core.scores import get_score_store
+from core.segments import SEGMENT_SECONDS, analyze_segments, summarize
+from core.spectrogram import (AUDIO_EXTS, HOP_LENGTH, IMG_EXTS, TRIM_SILENCE, load_spectrogram_db,
+                              load_spectrograms_db, preprocess_image, spectrogram_to_tensor,
+                              trimmed_seconds)
+from core.streaming import score_windows, streaming_spectrogram_db
+
+FIELDS = ["path", "match_rate", "error"] + (["trimmed_s"] if TRIM_SILENCE else [])
+# Recordings longer than this are streamed rather than decoded in one piece
+STREAM_SECONDS = 300.0
+# Files per worker call; audio within a chunk shares one batched STFT
+CHUNK_SIZE = 16
+
+def find_inputs(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(AUDIO_EXTS + IMG_EXTS):
+                yield os.path.normpath(os.path.join(dirpath, name))
+
+def should_stream(path, stream_seconds=STREAM_SECONDS):
+    """Whether ``path`` is a recording longer than ``stream_seconds``"""
+    if stream_seconds is None or not path.lower().endswith(AUDIO_EXTS):
+        return False
+    try:
+        sr, samples = audio_length(path)
+    except RuntimeError:
+        # not readable block-wise; decode it whole
+        return False
+    return samples > stream_seconds * sr
+
+def prepare_sample(path, stream=False):
+    """``(model input or None, seconds trimmed or None)`` for an audio file or image"""
+    if path.lower().endswith(IMG_EXTS):
+        return preprocess_image(path), None
+    if stream:
+        return spectrogram_to_tensor(streaming_spectrogram_db(path)), None
+    db, _ = load_spectrogram_db(path)
+    return spectrogram_to_tensor(db), trimmed_seconds(path, db)
+
+def prepare_samples(paths, stream=False):
+    """``prepare_sample`` for a chunk of files; ``(tensor, seconds trimmed, error)`` per path.
+
+    Unless streaming, the audio files of the chunk go through one batched STFT.
+    """
+    out = [None] * len(paths)
+    audio = [] if stream else [i for i, p in enumerate(paths) if not p.lower().endswith(IMG_EXTS)]
+    for i, loaded in zip(audio, load_spectrograms_db([paths[i] for i in audio])):
+        if loaded is not None:
+            out[i] = (spectrogram_to_tensor(loaded[0]), trimmed_seconds(paths[i], loaded[0]), "")
+    for i, path in enumerate(paths):
+        if out[i] is not None:
+            continue
+        # images, streamed recordings, and files the batch could not decode (for the reason)
+        try:
+            tensor, seconds = prepare_sample(path, stream)
+        except Exception as e:
+            out[i] = (None, None, str(e) or type(e).__name__)
+        else:
+            out[i] = (tensor, seconds, "" if tensor is not None else "unreadable input")
+    return out
+
+def chunk_inputs(paths, streamed=(), size=CHUNK_SIZE):
+    """Yields ``(paths, stream)`` worker calls, each streamed recording on its own"""
+    chunk = []
+    for path in paths:
+        if path in streamed:
+            yield [path], True
+            continue
+        chunk.append(path)
+        if len(chunk) == size:
+            yield chunk, False
+            chunk = []
+    if chunk:
+        yield chunk, False
+
+class ResultWriter:
+    """Appends result rows to a CSV or JSONL file, flushing after every row"""
+
+    def __init__(self, path, fields=FIELDS):
+        self.jsonl = path.lower().endswith(('.jsonl', '.json'))
+        self.done = self._read_done(path)
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not fresh:
+            with open(path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                partial = f.read(1) != b'\n'
+            if not self.jsonl:
+                # keep appending in the columns the file already has
+                with open(path, newline='', encoding='utf-8') as f:
+                    fields = next(csv.reader(f), None) or fields
+        self._f = open(path, 'a', newline='', encoding='utf-8')
+        if not fresh and partial:
+            # the previous run died mid-row
+            self._f.write('\n')
+        if not self.jsonl:
+            self._csv = csv.DictWriter(self._f, fieldnames=fields, extrasaction='ignore')
+            if fresh:
+                self._csv.writeheader()
+
+    def _read_done(self, path):
+        if not os.path.exists(path):
+            return set()
+        done = set()
+        with open(path, newline='', encoding='utf-8') as f:
+            if self.jsonl:
+                for line in f:
+                    try:
+                        row = json.loads(line)
+                        if not row.get("error"):
+                            done.add(row["path"])
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue
+            else:
+                done.update(row["path"] for row in csv.DictReader(f)
+                            if row.get("path") and not row.get("error"))
+        return done
+
+    def write(self, path, rate=None, error="", **extra):
+        row = {"path": path, "match_rate": None if rate is None else round(rate, 4), "error": error,
+               **extra}
+        if self.jsonl:
+            self._f.write(json.dumps(row) + '\n')
+        else:
+            self._csv.writerow(row)
+        self._f.flush()
+        self.done.add(path)
+
+    def close(self):
+        self._f.close()
+
+def run(in_dir, out, workers=None, batch_size=None, use_store=True, log=print,
+        stream_seconds=STREAM_SECONDS):
+    workers = workers or os.cpu_count() or 1
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    writer = ResultWriter(out)
+    todo = [p for p in find_inputs(in_dir) if p not in writer.done]
+    log(f"{len(todo)} file(s) to process, {len(writer.done)} already in {out}")
+    streamed = {p for p in todo if should_stream(p, stream_seconds)}
+    if streamed:
+        log(f"{len(streamed)} long recording(s) will be streamed")
+
+    scored = failed = 0
+    store = get_score_store() if use_store else None
+    if store is not None and todo:
+        known = store.lookup([p for p in todo if p not in streamed])
+        for path in todo:
+            if path in known:
+                writer.write(path, known[path])
+        scored += len(known)
+        todo = [p for p in todo if p not in known]
+        if known:
+            log(f"{len(known)} file(s) answered from the score store")
+    # small chunks for small runs so every worker still gets some
+    queue = chunk_inputs(todo, streamed, max(1, min(CHUNK_SIZE, -(-len(todo) // (workers * 2)))))
+    running = {}
+    ready_paths, ready = [], []
+    trimmed = {}
+    trimmed_total = 0.0
+    ctx = multiprocessing.get_context("spawn")
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+            def fill():
+                # keep the pool busy without materialising every tensor at once
+                while len(running) < workers * 2:
+                    chunk = next(queue, None)
+                    if chunk is None:
+                        break
+                    running[pool.submit(prepare_samples, *chunk)] = chunk[0]
+
+            fill()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    paths = running.pop(future)
+                    try:
+                        samples = future.result()
+                    except Exception as e:
+                        samples = [(None, None, str(e) or type(e).__name__)] * len(paths)
+                    for path, (tensor, seconds, error) in zip(paths, samples):
+                        if tensor is None:
+                            writer.write(path, error=error)
+                            profiling.count("errors")
+                            failed += 1
+                            continue
+                        if seconds is not None:
+                            trimmed[path] = round(seconds, 3)
+                            trimmed_total += seconds
+                        ready_paths.append(path); ready.append(tensor)
+                fill()
+                if len(ready) >= batch_size or (ready and not running):
+                    fresh = []
+                    for i, rate in iter_predictions(ready, batch_size):
+                        writer.write(ready_paths[i], rate, trimmed_s=trimmed.pop(ready_paths[i], None))
+                        fresh.append((ready_paths[i], rate))
+                    scored += len(fresh)
+                    if store is not None:
+                        store.put_many([(p, r) for p, r in fresh if p not in streamed])
+                    ready_paths, ready = [], []
+    finally:
+        writer.close()
+    log(f"Scored {scored}, failed {failed}.")
+    if TRIM_SILENCE:
+        log(f"Trimmed {trimmed_total:.1f}s of silence.")
+    snap = profiling.publish()
+    if snap:
+        log(profiling.format_snapshot(snap))
+    return scored, failed
+
+def segment_result(path, batch_size=None, stream_seconds=STREAM_SECONDS):
+    """Segment aggregates and timeline of one recording.
+
+    Long recordings are scored in consecutive non-overlapping windows from the
+    streaming STFT rather than in overlapping slices of a full decode.
+    """
+    batch_size = batch_size or DEFAULT_BATCH_SIZE
+    if not should_stream(path, stream_seconds):
+        return analyze_segments(path, batch_size=batch_size)
+    sr, samples = audio_length(path)
+    width = round(SEGMENT_SECONDS * sr / HOP_LENGTH) * HOP_LENGTH / sr
+    windows = score_windows(path, SEGMENT_SECONDS, batch_size)
+    if not windows:
+        raise ValueError("no audio to score")
+    timeline = [{"start": start, "end": min(start + width, samples / sr), "match_rate": rate}
+                for start, rate in windows]
+    return dict(summarize(rate for _, rate in windows), segments=len(windows), silent=0,
+                timeline=timeline)
+
+def run_segments(in_dir, out, batch_size=None, log=print, stream_seconds=STREAM_SECONDS):
+    writer = ResultWriter(out)
+    todo = [p for p in find_inputs(in_dir) if p.lower().endswith(AUDIO_EXTS) and p not in writer.done]
+    log(f"{len(todo)} recording(s) to segment, {len(writer.done)} already in {out}")
+    scored = failed = 0
+    try:
+        for path in todo:
+            try:
+                result = segment_result(path, batch_size, stream_seconds)
+            except Exception as e:
+                writer.write(path, error=str(e) or type(e).__name__)
+                profiling.count("errors")
+                failed += 1
+                continue
+            writer.write(path, result["top_k_mean"], **result)
+            scored += 1
+    finally:
+        writer.close()
+    log(f"Segmented {scored}, failed {failed}.")
+    snap = profiling.publish()
+    if snap:
+        log(profiling.format_snapshot(snap))
+    return scored, failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.batch", description=__doc__.splitlines()[0])
+    parser.add_argument("in_dir", help="directory tree of recordings and/or spectrogram images")
+    parser.add_argument("--out", default="results.csv", help="output file (.csv or .jsonl)")
+    parser.add_argument("--workers", type=int, default=None, help="conversion processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=None, help="samples per model call")
+    parser.add_argument("--trace", default=None, help="write per-stage timings as a Chrome trace")
+    parser.add_argument("--no-store", action="store_true", help="ignore and don't update the score store")
+    parser.add_argument("--stream", action="store_true", help="stream every recording instead of decoding it whole")
+    parser.add_argument("--stream-seconds", type=float, default=STREAM_SECONDS,
+                        help=f"stream recordings longer than this (default: {STREAM_SECONDS:g})")
+    parser.add_argument("--segments", action="store_true",
+                        help="score recordings window by window and write each timeline (.jsonl output)")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.in_dir):
+        parser.error(f"'{args.in_dir}' is not a directory")
+    if args.segments and not args.out.lower().endswith(('.jsonl', '.json')):
+        parser.error("--segments writes a timeline per file and needs a .jsonl output")
+    if args.trace:
+        profiling.enable(args.trace)
+    stream_seconds = 0 if args.stream else args.stream_seconds
+    if args.segments:
+        run_segments(args.in_dir, args.out, args.batch_size, stream_seconds=stream_seconds)
+        return 0
+    run(args.in_dir, args.out, args.workers, args.batch_size, not args.no_store,
+        stream_seconds=stream_seconds)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
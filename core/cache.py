@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import threading
+import numpy as np
+
+CACHE_DIR = os.path.join("data", "cache")
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+# Eviction frees down to this fraction of max_bytes, so full scans stay rare
+LOW_WATER = 0.9
+
+def file_digest(path, chunk_size=1 << 20):
+    """SHA-256 of a file's content"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+class SpectrogramCache:
+    """Persistent store of dB spectrograms keyed by audio content and STFT parameters.
+
+    Entries are ``.npy`` files stored as float16; a hit refreshes the file's mtime
+    so eviction drops the least recently used entries once ``max_bytes`` is exceeded,
+    down to ``LOW_WATER`` of it.
+    Hit/miss counters are per instance, so each worker process keeps its own.
+    """
+
+    def __init__(self, params, root=CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.params = json.dumps(params, sort_keys=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lock = threading.Lock()
+
+    def key(self, file_path):
+        return hashlib.sha256((file_digest(file_path) + self.params).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".npy")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            db = np.load(path).astype(np.float32)
+            os.utime(path)
+        except (OSError, ValueError):
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._lock:
+            self.hits += 1
+        return db
+
+    def put(self, key, db):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'wb') as f:
+            np.save(f, db.astype(np.float16))
+        os.replace(tmp, path)
+        with self._lock:
+            if self._size is None:
+                self._size = sum(size for _, _, size in self._entries())
+            else:
+                self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        for sub in os.scandir(self.root) if os.path.isdir(self.root) else ():
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                if entry.name.endswith(".npy"):
+                    st = entry.stat()
+                    yield entry.path, st.st_mtime, st.st_size
+
+    def _evict(self):
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        total = sum(size for _, _, size in entries)
+        for path, _, size in entries:
+            if total <= self.max_bytes * LOW_WATER:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._size = total
+
+    def stats(self):
+        entries = list(self._entries())
+        return {"hits": self.hits, "misses": self.misses,
+                "entries": len(entries), "bytes": sum(size for _, _, size in entries)}
+
+    def clear(self):
+        for path, _, _ in list(self._entries()):
+            os.remove(path)
+        self._size = 0
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""Sharded, memory-mapped training datasets.
+
+    python -m core.dataset Spectrograms/ shards/ --shard-size 1024
+
+Every top-level folder of the source tree is a class (e.g. ``(Real) Covid`` and
+``(Real) Non-Covid``), labelled by sorted folder name like the notebook's
+``np.unique`` mapping. Images are read as-is; audio goes through the same STFT
+and colour map as ``generate_spectrogram_tensor``. Samples are stored as
+uint8 ``(n, 224, 224, 3)`` ``.npy`` shards next to an ``index.json``, a
+quarter of the float32 footprint, and are only normalised when read back.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from core.spectrogram import (AUDIO_EXTS, IMG_EXTS, IMG_SIZE, load_spectrogram_db,
+                              load_spectrograms_db, read_image_rgb, spectrogram_to_rgb)
+
+SHARD_SIZE = 1024
+# Files per worker call; audio within a chunk shares one batched STFT
+CHUNK_SIZE = 16
+INDEX_NAME = "index.json"
+SHUFFLE_BUFFER = 1024
+
+def prepare_rgb(path):
+    """uint8 RGB sample for an image or audio file, None if it can't be read"""
+    try:
+        if path.lower().endswith(IMG_EXTS):
+            return read_image_rgb(path)
+        return spectrogram_to_rgb(load_spectrogram_db(path)[0])
+    except Exception:
+        return None
+
+def prepare_rgb_batch(paths):
+    """``prepare_rgb`` for a list of files, decoding the audio ones in one STFT batch"""
+    out = [None] * len(paths)
+    audio = [i for i, p in enumerate(paths) if not p.lower().endswith(IMG_EXTS)]
+    for i, p in enumerate(paths):
+        if i not in audio:
+            out[i] = prepare_rgb(p)
+    for i, loaded in zip(audio, load_spectrograms_db([paths[i] for i in audio])):
+        if loaded is not None:
+            try:
+                out[i] = spectrogram_to_rgb(loaded[0])
+            except Exception:
+                pass
+    return out
+
+def find_samples(src_dir):
+    """``(classes, [(path, label)])`` for a tree of one folder per class"""
+    classes = sorted(d for d in os.listdir(src_dir) if os.path.isdir(os.path.join(src_dir, d)))
+    samples = []
+    for label, name in enumerate(classes):
+        for dirpath, _, filenames in os.walk(os.path.join(src_dir, name)):
+            for filename in sorted(filenames):
+                if filename.lower().endswith(IMG_EXTS + AUDIO_EXTS):
+                    samples.append((os.path.join(dirpath, filename), label))
+    return classes, samples
+
+def build_dataset(src_dir, out_dir, shard_size=SHARD_SIZE, workers=None, seed=0, log=print):
+    """Converts ``src_dir`` into shards under ``out_dir``; returns the index path.
+
+    Files are shuffled once so every shard mixes classes, then converted in a
+    process pool and written straight into memory-mapped shard files, so peak
+    memory stays around one shard's worth of in-flight results.
+    """
+    classes, samples = find_samples(src_dir)
+    random.Random(seed).shuffle(samples)
+    os.makedirs(out_dir, exist_ok=True)
+    shards, skipped = [], []
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=ctx) as pool:
+        for start in range(0, len(samples), shard_size):
+            chunk = samples[start:start + shard_size]
+            n = len(shards)
+            images_name, labels_name = f"images_{n:05d}.npy", f"labels_{n:05d}.npy"
+            images = np.lib.format.open_memmap(os.path.join(out_dir, images_name), mode='w+',
+                                               dtype=np.uint8, shape=(len(chunk), IMG_SIZE, IMG_SIZE, 3))
+            labels, files = [], []
+            count = 0
+            paths = [p for p, _ in chunk]
+            converted = pool.map(prepare_rgb_batch, [paths[i:i + CHUNK_SIZE] for i in range(0, len(paths), CHUNK_SIZE)])
+            for (path, label), rgb in zip(chunk, (rgb for part in converted for rgb in part)):
+                if rgb is None:
+                    skipped.append(path)
+                    continue
+                images[count] = rgb
+                labels.append(label); files.append(os.path.relpath(path, src_dir))
+                count += 1
+            images.flush()
+            del images
+            np.save(os.path.join(out_dir, labels_name), np.asarray(labels, np.int32))
+            # Unreadable files leave unused rows at the end; ``count`` says how many are valid
+            shards.append({"images": images_name, "labels": labels_name, "count": count, "files": files})
+            log(f"shard {n}: {count} samples")
+    index = {"classes": classes, "img_size": IMG_SIZE, "total": sum(s["count"] for s in shards),
+             "shards": shards, "skipped": skipped}
+    index_path = os.path.join(out_dir, INDEX_NAME)
+    with open(index_path, "w") as f:
+        json.dump(index, f, indent=1)
+    log(f"{index['total']} samples in {len(shards)} shard(s), {len(skipped)} skipped -> {index_path}")
+    return index_path
+
+def load_index(path):
+    if os.path.isdir(path):
+        path = os.path.join(path, INDEX_NAME)
+    with open(path) as f:
+        index = json.load(f)
+    index["root"] = os.path.dirname(os.path.abspath(path))
+    return index
+
+def iter_samples(index, shuffle=True, validation_split=0.0, subset=None, seed=None):
+    """Yields ``(uint8 image, label)`` straight from the memory-mapped shards.
+
+    ``subset`` ``"training"``/``"validation"`` keeps the first/last
+    ``validation_split`` of every shard; shards were shuffled when built.
+    """
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(index["shards"])) if shuffle else range(len(index["shards"]))
+    for s in order:
+        shard = index["shards"][s]
+        count = shard["count"]
+        cut = int(round(count * (1 - validation_split)))
+        lo, hi = {"training": (0, cut), "validation": (cut, count)}.get(subset, (0, count))
+        images = np.load(os.path.join(index["root"], shard["images"]), mmap_mode='r')
+        labels = np.load(os.path.join(index["root"], shard["labels"]))
+        rows = lo + rng.permutation(hi - lo) if shuffle else range(lo, hi)
+        for i in rows:
+            yield images[i], labels[i]
+
+def shard_dataset(index, shuffle=True, validation_split=0.0, subset=None, seed=None):
+    """Unbatched ``tf.data`` dataset of ``(uint8 image, label)`` read from the shards"""
+    import tensorflow as tf
+
+    size = index["img_size"]
+    return tf.data.Dataset.from_generator(
+        lambda: iter_samples(index, shuffle, validation_split, subset, seed),
+        output_signature=(tf.TensorSpec((size, size, 3), tf.uint8), tf.TensorSpec((), tf.int32)))
+
+def normalize(x, y):
+    import tensorflow as tf
+    return tf.cast(x, tf.float32) / 255.0, y
+
+def make_tf_dataset(index_path, batch_size=32, shuffle=True, validation_split=0.0, subset=None,
+                    shuffle_buffer=SHUFFLE_BUFFER, seed=None):
+    """Streaming ``tf.data`` pipeline: shard-level and buffered shuffling, on-the-fly
+    normalisation to float32 [0, 1], batching and prefetching"""
+    import tensorflow as tf
+
+    dataset = shard_dataset(load_index(index_path), shuffle, validation_split, subset, seed)
+    if shuffle:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed)
+    dataset = dataset.map(normalize, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.dataset", description=__doc__.splitlines()[0])
+    parser.add_argument("src_dir", help="one sub-folder of spectrograms or recordings per class")
+    parser.add_argument("out_dir", help="where shards and index.json are written")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--workers", type=int, default=None, help="conversion processes (default: CPU count)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.src_dir):
+        parser.error(f"'{args.src_dir}' is not a directory")
+    build_dataset(args.src_dir, args.out_dir, args.shard_size, args.workers, args.seed)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""Audio decoding, optionally at a fixed canonical sample rate.
+
+``soundfile`` (libsndfile) decodes WAV/FLAC/OGG and, with recent builds, MP3
+directly; anything it rejects (m4a, ...) falls back to librosa's audioread
+path. Everything is downmixed to mono float32. By default clips keep their
+native rate, as the training spectrograms did; setting ``COVID_TARGET_SR``
+brings every clip to that rate with a polyphase resampler, so a clip costs
+the same STFT work per second whatever rate it was recorded at.
+"""
+
+import os
+from math import gcd
+import numpy as np
+import soundfile as sf
+
+# 0 keeps each file's native rate. Resampling changes the frequency axis the
+# model sees, so it is opt-in until a parity run backs a fixed rate
+TARGET_SR = int(os.environ.get("COVID_TARGET_SR", 0))
+MMAP_EXTS = ('.wav',)
+
+def _to_float(y):
+    if np.issubdtype(y.dtype, np.integer):
+        info = np.iinfo(y.dtype)
+        # unsigned 8-bit PCM is centred on 128
+        offset = (info.max + 1) // 2 if info.min == 0 else 0
+        return (y.astype(np.float32) - offset) / (info.max - offset + 1)
+    return y.astype(np.float32, copy=False)
+
+def _downmix(y):
+    return y.mean(axis=1, dtype=np.float32) if y.ndim > 1 else y
+
+def read_audio(file_path, mmap=False):
+    """Decodes a file to ``(mono float32 samples, native sample rate)``.
+
+    With ``mmap`` set, PCM WAV files are memory-mapped instead of read into a
+    buffer; only the float32 mono result is allocated.
+    """
+    if mmap and file_path.lower().endswith(MMAP_EXTS):
+        from scipy.io import wavfile
+        try:
+            sr, y = wavfile.read(file_path, mmap=True)
+            return _downmix(_to_float(y)), sr
+        except ValueError:
+            pass  # compressed or exotic WAV, let libsndfile handle it
+    try:
+        y, sr = sf.read(file_path, dtype='float32', always_2d=True)
+        return _downmix(y), sr
+    except (RuntimeError, TypeError):  # LibsndfileError derives from RuntimeError
+        import librosa
+        y, sr = librosa.load(file_path, sr=None, mono=True)
+        return y.astype(np.float32, copy=False), sr
+
+def resample(y, orig_sr, target_sr):
+    """Polyphase resampling by the reduced ``target_sr / orig_sr`` ratio"""
+    if not target_sr or orig_sr == target_sr:
+        return y
+    from scipy.signal import resample_poly
+    g = gcd(int(orig_sr), int(target_sr))
+    return resample_poly(y, int(target_sr) // g, int(orig_sr) // g).astype(np.float32)
+
+class StreamResampler:
+    """Block-by-block ``resample`` of a signal of known length ``n_in``.
+
+    Uses the anti-aliasing filter and alignment of ``scipy.signal.resample_poly``
+    and carries just enough input history between blocks, so the concatenated
+    output equals resampling the whole signal at once.
+    """
+
+    def __init__(self, orig_sr, target_sr, n_in):
+        from scipy.signal import firwin
+        g = gcd(int(orig_sr), int(target_sr))
+        self.up, self.down = int(target_sr) // g, int(orig_sr) // g
+        max_rate = max(self.up, self.down)
+        half_len = 10 * max_rate
+        h = firwin(2 * half_len + 1, 1.0 / max_rate, window=('kaiser', 5.0)) * self.up
+        pre_pad = self.down - half_len % self.down
+        self.h = np.concatenate([np.zeros(pre_pad), h])
+        # resample_poly drops this many leading outputs of the full convolution
+        self.skip = (half_len + pre_pad) // self.down
+        self.n_out = -(-n_in * self.up // self.down)
+        self._buf = np.zeros(0)
+        self._start = 0  # input index of _buf[0], always a multiple of down
+        self._next = 0   # next full-convolution output to produce
+
+    def process(self, block, final=False):
+        """Resampled float32 output that ``block`` completes; ``final`` flushes the tail"""
+        from scipy.signal import upfirdn
+        self._buf = np.concatenate([self._buf, np.asarray(block, np.float64)])
+        end = self._start + len(self._buf)
+        if final:
+            last = self.skip + self.n_out - 1
+            need = last * self.down // self.up + 1
+            if need > end:
+                self._buf = np.concatenate([self._buf, np.zeros(need - end)])
+        else:
+            # Outputs whose inputs have all arrived
+            last = (end - 1) * self.up // self.down
+        if last < self._next:
+            return np.zeros(0, np.float32)
+        offset = self._start * self.up // self.down
+        y = upfirdn(self.h, self._buf, self.up, self.down)[self._next - offset:last + 1 - offset]
+        first = self._next
+        self._next = last + 1
+        # Keep the inputs the next output still reaches back to
+        keep = max(0, (self._next * self.down - len(self.h) + 1) // self.up)
+        keep -= keep % self.down
+        if keep > self._start:
+            self._buf = self._buf[keep - self._start:]
+            self._start = keep
+        lo = max(0, self.skip - first)
+        hi = max(lo, min(len(y), self.skip + self.n_out - first))
+        return y[lo:hi].astype(np.float32)
+
+def audio_length(file_path, sr=TARGET_SR):
+    """``(sample_rate, samples)`` that ``decode_audio`` would return, from the header only.
+
+    Raises ``RuntimeError`` for formats ``soundfile`` can't open.
+    """
+    info = sf.info(file_path)
+    sr = sr or info.samplerate
+    return sr, -(-info.frames * sr // info.samplerate)
+
+def decode_audio(file_path, sr=TARGET_SR, mmap=False):
+    """Mono float32 samples at ``sr`` (native rate if ``sr`` is 0/None); returns ``(y, sr)``"""
+    y, native = read_audio(file_path, mmap)
+    return resample(y, native, sr), (sr or native)
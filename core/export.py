@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""Exports ``models/best_mod.h5`` to lightweight inference formats.
+
+    python -m core.export --tflite --quantize float16 --check heldout/
+    python -m core.export --tflite --quantize int8 --calibration train_sample/
+    python -m core.export --onnx
+
+The exported files land next to the Keras model where ``get_backend`` looks
+for them; select one with ``COVID_MODEL_BACKEND=tflite`` (or ``onnx``).
+"""
+
+import argparse
+import sys
+import numpy as np
+
+from core.batch import find_inputs
+from core.inference import (DEFAULT_BATCH_SIZE, IMG_SIZE, backend_path,
+                            get_model, load_input, predict_batch)
+from core.spectrogram import prepare_input
+
+QUANTIZATIONS = (None, "float16", "int8")
+
+def export_tflite(out_path=None, quantize=None, calibration=None):
+    """Converts the Keras model to TFLite, optionally with post-training quantization.
+
+    ``int8`` needs ``calibration``: representative model inputs (paths or arrays).
+    Inputs and outputs stay float32 either way.
+    """
+    import tensorflow as tf
+    if quantize not in QUANTIZATIONS:
+        raise ValueError(f"Unknown quantization '{quantize}', expected one of {QUANTIZATIONS}.")
+    converter = tf.lite.TFLiteConverter.from_keras_model(get_model())
+    if quantize:
+        converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantize == "float16":
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantize == "int8":
+        if not calibration:
+            raise ValueError("int8 quantization needs calibration inputs.")
+
+        def representative():
+            for item in calibration:
+                image = load_input(item)
+                if image is not None:
+                    yield [image[np.newaxis]]
+
+        converter.representative_dataset = representative
+    out_path = out_path or backend_path("tflite")
+    with open(out_path, 'wb') as f:
+        f.write(converter.convert())
+    return out_path
+
+def export_onnx(out_path=None, opset=13):
+    try:
+        import tf2onnx
+    except ImportError:
+        raise ImportError("ONNX export needs tf2onnx (pip install tf2onnx).")
+    import tensorflow as tf
+    out_path = out_path or backend_path("onnx")
+    spec = (tf.TensorSpec((None, IMG_SIZE, IMG_SIZE, 3), tf.float32, name="input"),)
+    tf2onnx.convert.from_keras(get_model(), input_signature=spec, opset=opset, output_path=out_path)
+    return out_path
+
+def check_backend_parity(inputs, backend, tolerance=1.0, batch_size=DEFAULT_BATCH_SIZE):
+    """Compares match rates of ``backend`` against the Keras model on held-out inputs.
+
+    Returns ``(passed, deltas)`` with the absolute difference in match-rate points
+    per readable input.
+    """
+    inputs = list(inputs)
+    reference = predict_batch(inputs, batch_size, "keras")
+    candidate = predict_batch(inputs, batch_size, backend)
+    deltas = [abs(a - b) for a, b in zip(reference, candidate) if a is not None]
+    return all(d <= tolerance for d in deltas), deltas
+
+def _load_dir(path):
+    tensors = []
+    for file_path in find_inputs(path):
+        try:
+            tensor = prepare_input(file_path)
+        except Exception as e:
+            print(f"Skipping {file_path}: {str(e) or type(e).__name__}")
+            continue
+        if tensor is not None:
+            tensors.append(tensor)
+    return tensors
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.export", description=__doc__.splitlines()[0])
+    parser.add_argument("--tflite", action="store_true", help=f"write {backend_path('tflite')}")
+    parser.add_argument("--quantize", choices=QUANTIZATIONS[1:], help="TFLite post-training quantization")
+    parser.add_argument("--calibration", help="directory of representative samples for int8")
+    parser.add_argument("--onnx", action="store_true", help=f"write {backend_path('onnx')}")
+    parser.add_argument("--check", metavar="DIR", help="held-out samples to compare against Keras")
+    parser.add_argument("--tolerance", type=float, default=1.0, help="allowed match-rate difference")
+    args = parser.parse_args(argv)
+    if not (args.tflite or args.onnx):
+        parser.error("nothing to export, pass --tflite and/or --onnx")
+
+    exported = []
+    if args.tflite:
+        calibration = _load_dir(args.calibration) if args.calibration else None
+        print("Wrote", export_tflite(quantize=args.quantize, calibration=calibration))
+        exported.append("tflite")
+    if args.onnx:
+        print("Wrote", export_onnx())
+        exported.append("onnx")
+
+    status = 0
+    if args.check:
+        heldout = _load_dir(args.check)
+        for name in exported:
+            passed, deltas = check_backend_parity(heldout, name, args.tolerance)
+            worst = max(deltas, default=0.0)
+            print(f"{name}: {len(deltas)} samples, max delta {worst:.3f} -> {'OK' if passed else 'FAIL'}")
+            status |= not passed
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
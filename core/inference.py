@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+
+import os
+import threading
+import time
+import numpy as np
+
+from core.profiling import span
+from core.spectrogram import (IMG_SIZE, generate_spectrogram, generate_spectrogram_tensor,
+                              preprocess_image)
+
+DEFAULT_BATCH_SIZE = 32
+
+MODEL_PATH = os.path.join('models', 'best_mod.h5')
+# Inference runtime, one of BACKENDS; the exported model sits next to best_mod.h5
+MODEL_BACKEND = os.environ.get("COVID_MODEL_BACKEND", "keras")
+# Batch shapes run once at load time, so no real prediction pays for tracing
+WARMUP_BATCH_SIZES = (1, DEFAULT_BATCH_SIZE)
+# Model threads; the audio workers share the same cores. 0 keeps the runtime default
+INTRA_OP_THREADS = int(os.environ.get("COVID_INTRA_OP_THREADS", max(1, (os.cpu_count() or 1) // 2)))
+INTER_OP_THREADS = int(os.environ.get("COVID_INTER_OP_THREADS", 1))
+
+_HANDLES = {}
+_HANDLES_LOCK = threading.Lock()
+
+class KerasBackend:
+    """Full Keras model with a traced forward pass"""
+    extension = ".h5"
+
+    def __init__(self, path, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        # TensorFlow is only imported once a model is actually needed
+        import tensorflow as tf
+        from tensorflow.keras.models import load_model
+        try:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        except RuntimeError:
+            pass # the TF runtime is already running with its own settings
+        self.model = load_model(path)
+        # A fixed signature keeps ragged last batches from retracing
+        self._fn = tf.function(
+            lambda x: self.model(x, training=False),
+            input_signature=[tf.TensorSpec([None, IMG_SIZE, IMG_SIZE, 3], tf.float32)])
+
+    def predict(self, x):
+        return self._fn(x).numpy()
+
+class TFLiteBackend:
+    """TFLite interpreter; prefers a standalone runtime so TensorFlow isn't needed"""
+    extension = ".tflite"
+
+    def __init__(self, path, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        try:
+            from ai_edge_litert.interpreter import Interpreter
+        except ImportError:
+            try:
+                from tflite_runtime.interpreter import Interpreter
+            except ImportError:
+                import tensorflow as tf
+                Interpreter = tf.lite.Interpreter
+        self.interpreter = Interpreter(model_path=path, num_threads=intra_op_threads or os.cpu_count())
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._shape = None
+
+    def predict(self, x):
+        if x.shape != self._shape:
+            self.interpreter.resize_tensor_input(self._input['index'], x.shape)
+            self.interpreter.allocate_tensors()
+            self._shape = x.shape
+        scale, zero = self._input['quantization']
+        if scale:
+            x = np.round(x / scale + zero).astype(self._input['dtype'])
+        self.interpreter.set_tensor(self._input['index'], x)
+        self.interpreter.invoke()
+        out = self.interpreter.get_tensor(self._output['index'])
+        scale, zero = self._output['quantization']
+        return (out.astype(np.float32) - zero) * scale if scale else out
+
+class OnnxBackend:
+    """ONNX Runtime on the CPU execution provider"""
+    extension = ".onnx"
+
+    def __init__(self, path, intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        import onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = intra_op_threads
+        options.inter_op_num_threads = inter_op_threads
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self._input = self.session.get_inputs()[0].name
+
+    def predict(self, x):
+        return self.session.run(None, {self._input: x})[0]
+
+BACKENDS = {"keras": KerasBackend, "tflite": TFLiteBackend, "onnx": OnnxBackend}
+
+def backend_path(name):
+    return os.path.splitext(MODEL_PATH)[0] + BACKENDS[name].extension
+
+class ModelHandle:
+    """One inference backend, loaded exactly once and warmed up before use.
+
+    Concurrent ``get`` calls wait on a lock while the first one loads the
+    model and runs a dummy batch of each ``warmup_batch_sizes``. Timings of
+    both steps and the last load error are kept for ``stats``; a failed load
+    is retried on the next ``get``.
+    """
+
+    def __init__(self, name, warmup_batch_sizes=WARMUP_BATCH_SIZES,
+                 intra_op_threads=INTRA_OP_THREADS, inter_op_threads=INTER_OP_THREADS):
+        self.name = name
+        self.path = backend_path(name)
+        self.warmup_batch_sizes = warmup_batch_sizes
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.error = None
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._backend is not None
+
+    def get(self):
+        if self._backend is None:
+            with self._lock:
+                if self._backend is None:
+                    self._backend = self._load()
+        return self._backend
+
+    def _load(self):
+        try:
+            if not os.path.exists(self.path):
+                raise FileNotFoundError(f"Model file '{self.path}' not found.")
+            start = time.perf_counter()
+            with span("model.load", backend=self.name):
+                backend = BACKENDS[self.name](self.path, self.intra_op_threads, self.inter_op_threads)
+            self.load_seconds = time.perf_counter() - start
+            start = time.perf_counter()
+            with span("model.warmup", batches=list(self.warmup_batch_sizes)):
+                for size in self.warmup_batch_sizes:
+                    backend.predict(np.zeros((size, IMG_SIZE, IMG_SIZE, 3), np.float32))
+            self.warmup_seconds = time.perf_counter() - start
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+            raise
+        self.error = None
+        return backend
+
+    def stats(self):
+        return {"backend": self.name, "path": self.path, "loaded": self.loaded,
+                "load_s": self.load_seconds, "warmup_s": self.warmup_seconds, "error": self.error,
+                "intra_op_threads": self.intra_op_threads, "inter_op_threads": self.inter_op_threads}
+
+def get_handle(name=None):
+    """The process-wide ``ModelHandle`` of backend ``name``, default MODEL_BACKEND"""
+    name = name or MODEL_BACKEND
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend '{name}', expected one of {sorted(BACKENDS)}.")
+    with _HANDLES_LOCK:
+        if name not in _HANDLES:
+            _HANDLES[name] = ModelHandle(name)
+        return _HANDLES[name]
+
+def get_backend(name=None):
+    """Loads (once) and returns the warmed-up inference backend ``name``"""
+    return get_handle(name).get()
+
+def get_model():
+    """The Keras model itself, regardless of the configured backend"""
+    return get_backend("keras").model
+
+def load_input(item):
+    """Accepts an image path or an already preprocessed array"""
+    if isinstance(item, np.ndarray):
+        return item.astype('float32', copy=False).reshape(IMG_SIZE, IMG_SIZE, 3)
+    return preprocess_image(item)
+
+def to_match_rate(res):
+    return float((1 - res[0]) * 100)
+
+def _run_batch(backend, indices, images):
+    with span("predict", batch=len(images)):
+        res = backend.predict(np.stack(images))
+    return zip(indices, (to_match_rate(r) for r in res))
+
+def iter_predictions(inputs, batch_size=DEFAULT_BATCH_SIZE, backend=None):
+    """Yields ``(index, match_rate)`` in input order with one model call per batch.
+
+    Inputs may be image paths or preprocessed arrays; unreadable images are skipped.
+    ``backend`` is a backend name or instance, default the configured one.
+    """
+    if not hasattr(backend, "predict"):
+        backend = get_backend(backend)
+    indices, images = [], []
+    for i, item in enumerate(inputs):
+        image = load_input(item)
+        if image is None:
+            continue
+        indices.append(i); images.append(image)
+        if len(images) >= batch_size:
+            yield from _run_batch(backend, indices, images)
+            indices, images = [], []
+    if images:
+        yield from _run_batch(backend, indices, images)
+
+def predict_batch(inputs, batch_size=DEFAULT_BATCH_SIZE, backend=None):
+    """Match rates for ``inputs`` in order, None where an image could not be read"""
+    inputs = list(inputs)
+    rates = [None] * len(inputs)
+    for i, rate in iter_predictions(inputs, batch_size, backend):
+        rates[i] = rate
+    return rates
+
+def check_spectrogram_parity(audio_paths, tolerance=2.0, backend=None):
+    """Compares match rates of the rendered JPEG path and the in-memory tensor path.
+
+    Returns ``(passed, deltas)`` where ``deltas`` holds the absolute difference in
+    match-rate points per file and ``passed`` tells whether all stay within ``tolerance``.
+    A file that either path can't convert or score gets a None delta and fails the check.
+    """
+    def rates(convert):
+        inputs = []
+        for path in audio_paths:
+            try:
+                inputs.append(convert(path))
+            except Exception:
+                inputs.append(None)
+        present = [i for i, item in enumerate(inputs) if item is not None]
+        out = [None] * len(inputs)
+        for i, rate in iter_predictions([inputs[i] for i in present], backend=backend):
+            out[present[i]] = rate
+        return out
+
+    rendered = rates(generate_spectrogram)
+    direct = rates(lambda path: generate_spectrogram_tensor(path)[0])
+    deltas = [None if a is None or b is None else abs(a - b) for a, b in zip(rendered, direct)]
+    return all(d is not None and d <= tolerance for d in deltas), deltas
+
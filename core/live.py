@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""Live microphone capture with a streaming spectrogram and rolling score.
+
+The ``sounddevice`` callback only copies each incoming block into a ring
+buffer and advances a counter; it never waits on the consumer. The consumer
+turns every complete hop into an STFT column as audio arrives and re-scores the
+most recent window at a fixed cadence, so a score for the end of the recording
+is ready as soon as capture stops. Scores come from the shared inference server
+when one is configured; if no model can be reached, live scoring switches off
+and the recording itself carries on.
+"""
+
+import collections
+import time
+import numpy as np
+
+from core.decode import TARGET_SR
+from core.inference import iter_predictions
+from core.server import INFERENCE_SERVER, InferenceClient
+from core.spectrogram import N_FFT, HOP_LENGTH, amplitude_to_db, spectrogram_to_tensor
+
+# The rate RecordThread has always captured at, unless a canonical one is set
+LIVE_SR = TARGET_SR or 44100
+LIVE_WINDOW_SECONDS = 3.0
+SCORE_INTERVAL = 0.25
+
+class RingBuffer:
+    """Single-producer/single-consumer float32 ring buffer.
+
+    The producer writes samples and only then bumps ``written``; a plain int
+    store is atomic under the GIL, so the reader never sees a half-written
+    block and neither side takes a lock.
+    """
+
+    def __init__(self, capacity):
+        self._buf = np.zeros(capacity, np.float32)
+        self.capacity = capacity
+        self.written = 0
+
+    def write(self, x):
+        n = len(x)
+        if n > self.capacity:
+            x, n = x[-self.capacity:], self.capacity
+        pos = self.written % self.capacity
+        first = min(n, self.capacity - pos)
+        self._buf[pos:pos + first] = x[:first]
+        self._buf[:n - first] = x[first:]
+        self.written += n
+
+    def read(self, start, n):
+        """Copy of samples ``[start, start + n)``; indices before 0 read as silence"""
+        out = np.zeros(n, np.float32)
+        lo = max(start, 0, self.written - self.capacity)
+        hi = min(start + n, self.written)
+        if hi > lo:
+            idx = np.arange(lo, hi) % self.capacity
+            out[lo - start:hi - start] = self._buf[idx]
+        return out
+
+class LiveAnalyzer:
+    """Incremental STFT and rolling score over a ring buffer of live audio"""
+
+    def __init__(self, sr=LIVE_SR, max_seconds=60.0, window_seconds=LIVE_WINDOW_SECONDS,
+                 score_interval=SCORE_INTERVAL, predict=None, server=INFERENCE_SERVER):
+        self.sr = sr
+        self.ring = RingBuffer(int(max_seconds * sr) + N_FFT)
+        self.window = np.hanning(N_FFT).astype(np.float32)
+        self.scale = np.float32(2 / np.sum(self.window))
+        self.columns = collections.deque(maxlen=max(1, int(round(window_seconds * sr / HOP_LENGTH))))
+        self.score_every = max(1, int(round(score_interval * sr / HOP_LENGTH)))
+        self.predict = predict or self._predict
+        self.server = server
+        self.client = None
+        self.frames = 0
+        self.score = None
+        # Why live scoring was switched off, if it was
+        self.score_error = None
+
+    def callback(self, indata, frames, time_info, status):
+        """``sounddevice.InputStream`` callback"""
+        self.ring.write(indata[:, 0])
+
+    def update(self):
+        """Adds STFT columns for all complete hops; returns a fresh score or None"""
+        return self._advance(self.ring.written - N_FFT // 2)
+
+    def _advance(self, last_center):
+        scored = False
+        # Frame k is centred on sample k * hop, as with librosa.stft(center=True)
+        while self.frames * HOP_LENGTH <= last_center:
+            frame = self.ring.read(self.frames * HOP_LENGTH - N_FFT // 2, N_FFT)
+            self.columns.append(np.abs(np.fft.rfft(frame * self.window)).astype(np.float32) * self.scale)
+            self.frames += 1
+            if self.frames % self.score_every == 0:
+                self._score()
+                scored = True
+        return self.score if scored else None
+
+    def _predict(self, tensor):
+        if self.server:
+            self.client = self.client or InferenceClient(self.server)
+            return next(self.client.iter_predictions([tensor], 1))[1]
+        return next(iter_predictions([tensor], 1))[1]
+
+    def _score(self):
+        if self.predict is None:
+            return
+        mag = np.stack(self.columns, axis=1)
+        try:
+            self.score = self.predict(spectrogram_to_tensor(amplitude_to_db(mag)))
+        except Exception as e:
+            # No model file or server: keep recording without a rolling score
+            self.score_error = str(e) or type(e).__name__
+            self.predict = None
+
+    def close(self):
+        if self.client:
+            self.client.close()
+            self.client = None
+
+    def finish(self):
+        """Flushes the zero-padded tail frames and scores the final window"""
+        self._advance(self.ring.written)
+        if self.columns:
+            self._score()
+        return self.score
+
+    def record(self, seconds, on_progress=None, on_score=None, should_stop=None):
+        """Captures ``seconds`` of audio while scoring; returns the samples as float32"""
+        import sounddevice as sd
+        total = int(seconds * self.sr)
+        try:
+            with sd.InputStream(samplerate=self.sr, channels=1, dtype='float32',
+                                blocksize=HOP_LENGTH, callback=self.callback):
+                while self.ring.written < total and not (should_stop and should_stop()):
+                    time.sleep(HOP_LENGTH / self.sr)
+                    score = self.update()
+                    if on_progress:
+                        on_progress(min(self.ring.written, total) / total)
+                    if score is not None and on_score:
+                        on_score(self.frames * HOP_LENGTH / self.sr, score)
+            score = self.finish()
+        finally:
+            self.close()
+        if score is not None and on_score:
+            on_score(self.ring.written / self.sr, score)
+        n = min(self.ring.written, total)
+        return self.ring.read(0, n)
@@ -1,60 +1,120 @@
 # -*- coding: utf-8 -*-
 
-import os
-import cv2
-import numpy as np
-from tensorflow.keras.models import load_model
-from PyQt5.QtCore import QThread, pyqtSignal
-
-_MODEL_CACHE = None
-
-def get_model():
-    global _MODEL_CACHE
-    model_path = os.path.join('models', 'best_mod.h5')
-    if _MODEL_CACHE is None:
-        if not os.path.exists(model_path):
-            raise FileNotFoundError(f"Model file '{model_path}' not found.")
-        _MODEL_CACHE = load_model(model_path)
-    return _MODEL_CACHE
-
-class ModelLoaderThread(QThread):
-    """Pre-loads model in background to avoid lag on first prediction"""
+import sqlite3
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from core import profiling
+from core.inference import (DEFAULT_BATCH_SIZE, get_model, get_backend, get_handle,
+                            preprocess_image, load_input, iter_predictions, predict_batch,
+                            check_spectrogram_parity)
+from core.pipeline import SessionPipeline
+from core.scheduler import INFERENCE
+from core.scores import get_score_store, iter_cached_predictions
+from core.tasks import ScheduledTask
+from core.server import INFERENCE_SERVER, InferenceClient
+
+class ModelLoaderThread(ScheduledTask):
+    """Pre-loads and warms up the model in background to avoid lag on first prediction"""
+    priority = INFERENCE
     loaded = pyqtSignal()
+    report = pyqtSignal(dict) # ModelHandle.stats() once the model is ready
+    error = pyqtSignal(str)
     
     def run(self):
         try:
-            get_model()
+            if INFERENCE_SERVER:
+                # The shared service holds the model, just check it answers
+                InferenceClient(INFERENCE_SERVER).close()
+            else:
+                handle = get_handle()
+                handle.get()
+                self.report.emit(handle.stats())
             self.loaded.emit()
-        except:
-            pass
+        except Exception as e:
+            self.error.emit(str(e) or type(e).__name__)
 
-class AnalysisThread(QThread):
-    """Background inference thread to keep UI smooth during heavy ML tasks"""
+class AnalysisThread(ScheduledTask):
+    """Background inference task to keep UI smooth during heavy ML tasks.
+
+    Checks for cancellation and yields to a live recording between results.
+    With a local model, inputs already scored in an earlier session are
+    answered from the score store and only the rest reach the model.
+    """
+    priority = INFERENCE
     result_ready = pyqtSignal(int, str, float) # index, img_path, result
     finished = pyqtSignal()
     error = pyqtSignal(str)
+    metrics = pyqtSignal(dict) # profiling snapshot, only while profiling is enabled
 
-    def __init__(self, selected_files):
-        super().__init__()
+    def __init__(self, selected_files, batch_size=DEFAULT_BATCH_SIZE, server=INFERENCE_SERVER,
+                 scores=None, scheduler=None, use_store=True):
+        super().__init__(scheduler)
         self.selected_files = selected_files
+        self.batch_size = batch_size
+        self.server = server
+        # img_path -> match rate already computed, e.g. by a SessionPipeline
+        self.scores = scores if scores is not None else {}
+        self.use_store = use_store
 
     def run(self):
         try:
-            model = get_model()
-            for i, img_path in enumerate(self.selected_files):
-                image = cv2.imread(img_path)
-                if image is None: continue
-                
-                image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-                image = cv2.resize(image, (224, 224))
-                image = np.array(image).astype('float32') / 255
-                image = image.reshape(1, 224, 224, 3)
-                
-                res = model.predict(image, verbose=0)
-                match_rate = (1 - res[0][0]) * 100
-                
-                self.result_ready.emit(i, img_path, float(match_rate))
+            # One snapshot: the session pipeline keeps adding scores while this runs
+            known = dict(self.scores)
+            client = store = None
+            if self.server:
+                if not all(isinstance(item, str) and item in known for item in self.selected_files):
+                    client = InferenceClient(self.server)
+            elif self.use_store:
+                # A missing model file is reported by iter_predictions on a miss
+                try:
+                    store = get_score_store()
+                except (OSError, sqlite3.Error):
+                    pass
+            predict = client.iter_predictions if client else iter_predictions
+            for i, match_rate in iter_cached_predictions(self.selected_files, self.batch_size,
+                                                         predict, store, known=known):
+                if not self.yield_to_urgent():
+                    break
+                item = self.selected_files[i]
+                self.result_ready.emit(i, item if isinstance(item, str) else "", match_rate)
+            if client:
+                client.close()
             
+            snap = profiling.publish()
+            if snap:
+                self.metrics.emit(snap)
             self.finished.emit()
         except Exception as e:
+            profiling.count("errors")
             self.error.emit(str(e))
+
+class SessionBridge(QObject):
+    """Owns a SessionPipeline and re-emits its callbacks as Qt signals on the GUI thread"""
+    converted = pyqtSignal(str, str) # img_path, audio_path ("" for images)
+    scored = pyqtSignal(str, float)
+    error = pyqtSignal(str)
+    metrics = pyqtSignal(dict) # profiling snapshot after each scored batch, while enabled
+
+    def __init__(self, **kwargs):
+        super().__init__()
+        self.pipeline = SessionPipeline(
+            on_converted=lambda img, audio: self.converted.emit(img, audio or ""),
+            on_scored=self.scored.emit, on_error=self.error.emit, **kwargs)
+        profiling.subscribe(self.metrics.emit)
+
+    @property
+    def results(self):
+        return self.pipeline.results
+
+    def submit(self, paths):
+        self.pipeline.submit(paths)
+
+    def prescore(self, img_paths):
+        self.pipeline.prescore(img_paths)
+
+    def cancel(self):
+        self.pipeline.cancel()
+
+    def close(self):
+        profiling.unsubscribe(self.metrics.emit)
+        self.pipeline.close(wait=False)
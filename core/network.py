@@ -0,0 +1,26 @@
+# -*- coding: utf-8 -*-
+
+from core.spectrogram import IMG_SIZE
+
+def build_model(input_shape=(IMG_SIZE, IMG_SIZE, 3)):
+    """The notebook's Sequential CNN, compiled as it is for training"""
+    from tensorflow.keras import layers
+    from tensorflow.keras.models import Sequential
+
+    model = Sequential([
+        layers.Input(shape=input_shape),
+        layers.Conv2D(32, kernel_size=(3, 3), activation="relu"),
+        layers.Conv2D(64, kernel_size=(3, 3), activation="relu"),
+        layers.MaxPooling2D(pool_size=(2, 2)),
+        layers.Dropout(0.25),
+        layers.Conv2D(64, kernel_size=(3, 3), activation="relu"),
+        layers.MaxPooling2D(pool_size=(2, 2)),
+        layers.Dropout(0.25),
+        layers.Flatten(),
+        layers.Dense(32, activation="relu"),
+        layers.Dropout(0.5),
+        # float32 output keeps the sigmoid/loss stable under a mixed-precision policy
+        layers.Dense(1, activation="sigmoid", dtype="float32"),
+    ])
+    model.compile(loss="binary_crossentropy", optimizer="adam", metrics=["accuracy"])
+    return model
@@ -0,0 +1,268 @@
+# -*- coding: utf-8 -*-
+"""Background audio -> score pipeline for a diagnostic session.
+
+Three stages run concurrently, joined by bounded queues so a fast stage
+can't run away from a slow one:
+
+    spectrogram  decode + STFT in a process pool (cache hits skip both); files
+                 queued together share one batched STFT per worker call
+    tensor       colour-map to the model input, writing the JPEG for display
+    inference    batches whatever tensors are ready and scores them
+
+Samples are scored as soon as they are converted, so by the time the user asks
+for results most of them are already in ``results``. Both the conversion and
+the inference stage give way to more urgent work on the shared scheduler (a
+live recording) before taking on the next file or batch. With a local model,
+images scored in an earlier session are answered from the score store.
+``cancel()`` drops everything submitted so far at the next stage it reaches.
+"""
+
+import multiprocessing
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from core import profiling
+from core.inference import DEFAULT_BATCH_SIZE, get_backend, iter_predictions
+from core.scheduler import CONVERSION, INFERENCE, CancelToken, get_scheduler
+from core.scores import get_score_store, iter_cached_predictions
+from core.server import INFERENCE_SERVER, InferenceClient
+from core.spectrogram import (IMG_EXTS, load_spectrogram_db, load_spectrograms_db,
+                              preprocess_image, spectrogram_image_path, spectrogram_to_tensor)
+
+QUEUE_SIZE = 16
+# Most recordings per worker call
+CHUNK_SIZE = 8
+
+_STOP = object()
+
+class SessionPipeline:
+    """Converts and scores submitted files in the background.
+
+    Callbacks run on the pipeline's threads: ``on_converted(img_path, audio_path)``
+    once a sample can be displayed (``audio_path`` is None for images),
+    ``on_scored(img_path, match_rate)`` and ``on_error(message)``.
+    """
+
+    def __init__(self, on_converted=None, on_scored=None, on_error=None, workers=None,
+                 batch_size=DEFAULT_BATCH_SIZE, queue_size=QUEUE_SIZE, server=INFERENCE_SERVER,
+                 scheduler=None, use_store=True):
+        self.on_converted = on_converted or (lambda img, audio: None)
+        self.on_scored = on_scored or (lambda img, rate: None)
+        self.on_error = on_error or (lambda msg: None)
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.server = server
+        self.scheduler = scheduler
+        self.use_store = use_store and not server
+        self.results = {}
+        self._intake = queue.Queue()
+        # Holding futures in a bounded queue caps the conversions in flight
+        self._spectra = queue.Queue(queue_size)
+        self._tensors = queue.Queue(queue_size)
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._pool = None
+        self._threads = []
+        # Shared by everything submitted since the last cancel()
+        self._token = CancelToken()
+
+    def submit(self, paths):
+        """Queues audio files or spectrogram images for conversion and scoring"""
+        self._enqueue([(p, True) for p in paths])
+
+    def prescore(self, img_paths):
+        """Queues already displayed spectrogram images for scoring only"""
+        self._enqueue([(p, False) for p in img_paths])
+
+    def _enqueue(self, items):
+        if not self._threads:
+            self._start()
+        with self._idle:
+            self._pending += len(items)
+        token = self._token
+        for path, announce in items:
+            self._intake.put((path, announce, token))
+
+    def cancel(self):
+        """Abandons all submitted work: nothing more is converted, announced or scored"""
+        self._token.cancel()
+        self._token = CancelToken()
+
+    def _start(self):
+        self.scheduler = self.scheduler or get_scheduler()
+        self._pool = self._make_pool()
+        for target in (self._spectrogram_stage, self._tensor_stage, self._inference_stage):
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _make_pool(self):
+        if self.workers > 1:
+            # spawn keeps Qt/TensorFlow state of this process out of the workers
+            ctx = multiprocessing.get_context("spawn")
+            return ProcessPoolExecutor(max_workers=self.workers, mp_context=ctx)
+        return ThreadPoolExecutor(max_workers=1)
+
+    def _convert(self, paths):
+        """Submits ``paths`` for one batched conversion, replacing the pool if a worker died"""
+        try:
+            return self._pool.submit(load_spectrograms_db, paths)
+        except BrokenProcessPool:
+            # e.g. a worker was OOM-killed; its futures fail on their own
+            profiling.count("pool.restarts")
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = self._make_pool()
+            return self._pool.submit(load_spectrograms_db, paths)
+
+    def _take(self, item):
+        """``item`` plus whatever else is already queued under the same token"""
+        items = [item]
+        while len(items) < self.workers * CHUNK_SIZE:
+            try:
+                nxt = self._intake.get_nowait()
+            except queue.Empty:
+                break
+            if nxt is _STOP or nxt[2] is not item[2]:
+                return items, nxt
+            items.append(nxt)
+        return items, None
+
+    def _done(self, n=1):
+        with self._idle:
+            self._pending -= n
+            self._idle.notify_all()
+
+    def _fail(self, path, e):
+        profiling.count("errors")
+        self.on_error(f"{os.path.basename(path)}: {str(e) or type(e).__name__}")
+        self._done()
+
+    def _spectrogram_stage(self):
+        held = None
+        while True:
+            item, held = held or self._intake.get(), None
+            if item is _STOP:
+                self._spectra.put(_STOP)
+                return
+            items, held = self._take(item)
+            token = item[2]
+            audio = [path for path, _, _ in items if not path.lower().endswith(IMG_EXTS)]
+            # spread the recordings over the workers, at most CHUNK_SIZE per call
+            size = min(CHUNK_SIZE, -(-len(audio) // self.workers)) or 1
+            chunks = [audio[i:i + size] for i in range(0, len(audio), size)]
+            try:
+                self.scheduler.yield_to(CONVERSION, token)
+                if token.cancelled:
+                    self._done(len(items))
+                    continue
+                futures = [self._convert(chunk) for chunk in chunks]
+            except Exception as e:
+                for path, _, _ in items:
+                    self._fail(path, e)
+                continue
+            n = 0
+            for path, announce, _ in items:
+                if path.lower().endswith(IMG_EXTS):
+                    self._spectra.put((path, announce, token, None, None))
+                else:
+                    self._spectra.put((path, announce, token, futures[n // size], n % size))
+                    n += 1
+
+    def _tensor_stage(self):
+        while True:
+            item = self._spectra.get()
+            if item is _STOP:
+                self._tensors.put(_STOP)
+                return
+            path, announce, token, future, index = item
+            if token.cancelled:
+                if future is not None:
+                    future.cancel()
+                self._done()
+                continue
+            try:
+                if future is None:
+                    img_path, audio_path = path, None
+                    tensor = preprocess_image(path)
+                    if tensor is None:
+                        raise ValueError("unreadable image")
+                else:
+                    # the batch only says which files failed; decode again for the reason
+                    db, key = future.result()[index] or load_spectrogram_db(path)
+                    img_path, audio_path = spectrogram_image_path(path, key), path
+                    tensor = spectrogram_to_tensor(db, img_path)
+            except Exception as e:
+                self._fail(path, e)
+                continue
+            if token.cancelled:
+                self._done()
+                continue
+            if announce:
+                self.on_converted(img_path, audio_path)
+            self._tensors.put((img_path, tensor, token))
+
+    def _inference_stage(self):
+        client = store = None
+        if self.use_store:
+            try:
+                store = get_score_store()
+            except (OSError, sqlite3.Error):
+                pass
+        while True:
+            batch = [self._tensors.get()]
+            # Score whatever is ready right now rather than waiting for a full batch
+            while len(batch) < self.batch_size and batch[-1] is not _STOP:
+                try:
+                    batch.append(self._tensors.get_nowait())
+                except queue.Empty:
+                    break
+            stop = batch[-1] is _STOP
+            batch = [b for b in batch if b is not _STOP]
+            live = [b for b in batch if not b[2].cancelled]
+            self._done(len(batch) - len(live))
+            batch = [(img, tensor) for img, tensor, _ in live]
+            if batch:
+                self.scheduler.yield_to(INFERENCE)
+                try:
+                    if self.server:
+                        client = client or InferenceClient(self.server)
+                        predictions = client.iter_predictions([t for _, t in batch], self.batch_size)
+                    else:
+                        predictions = iter_cached_predictions(
+                            [t for _, t in batch], self.batch_size,
+                            lambda inputs, batch_size: iter_predictions(inputs, batch_size, get_backend()),
+                            store, paths=[img for img, _ in batch])
+                    for i, rate in predictions:
+                        self.results[batch[i][0]] = rate
+                        self.on_scored(batch[i][0], rate)
+                except Exception as e:
+                    profiling.count("errors")
+                    self.on_error(str(e) or type(e).__name__)
+                self._done(len(batch))
+                profiling.publish()
+            if stop:
+                if client:
+                    client.close()
+                return
+
+    @property
+    def pending(self):
+        return self._pending
+
+    def wait(self, timeout=None):
+        """Blocks until everything submitted so far is scored or failed"""
+        with self._idle:
+            return self._idle.wait_for(lambda: self._pending <= 0, timeout)
+
+    def close(self, wait=True):
+        if self._threads:
+            self._intake.put(_STOP)
+            if wait:
+                for thread in self._threads:
+                    thread.join()
+            self._pool.shutdown(wait=wait, cancel_futures=not wait)
+            self._threads = []
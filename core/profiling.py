@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""Opt-in timing and counters for the processing stages.
+
+    COVID_TRACE=trace.json python main.py     (COVID_TRACE=1: no trace file)
+    python -m core.batch intake/ --trace trace.json
+
+Stages are wrapped in ``with span("stft"):`` and events counted with
+``count("cache.hit")``. While disabled both return immediately after a single
+flag check. Once enabled, every span is aggregated into ``snapshot()`` and,
+with a trace path, written as one Chrome trace event per line: the file opens
+with ``[`` and each line is an event followed by a comma, which
+``chrome://tracing`` and Perfetto load as-is while staying appendable.
+
+Enabling sets ``COVID_TRACE`` so spawned conversion workers trace into the
+same file; their aggregates stay in their own process and only show in the
+trace. ``subscribe(callback)`` receives a snapshot on every ``publish()``.
+"""
+
+import collections
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+
+TRACE_ENV = "COVID_TRACE"
+
+_enabled = False
+_trace = None
+_lock = threading.Lock()
+_timers = collections.defaultdict(lambda: [0, 0.0, 0.0])  # name -> [count, total s, max s]
+_counters = collections.Counter()
+_subscribers = []
+_NULL = nullcontext()
+
+def enabled():
+    return _enabled
+
+def enable(trace_path=None):
+    """Starts collecting; with ``trace_path`` also writes Chrome trace events there"""
+    global _enabled, _trace
+    with _lock:
+        if trace_path and _trace is None:
+            trace_path = os.path.abspath(trace_path)
+            _trace = open(trace_path, "a", buffering=1)
+            if _trace.tell() == 0:
+                _trace.write("[\n")
+            os.environ[TRACE_ENV] = trace_path
+        _enabled = True
+
+def disable():
+    global _enabled, _trace
+    with _lock:
+        _enabled = False
+        if _trace is not None:
+            _trace.close()
+            _trace = None
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+def _emit(event):
+    if _trace is not None:
+        event["pid"] = os.getpid()
+        event["tid"] = threading.get_ident()
+        _trace.write(json.dumps(event) + ",\n")
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        with _lock:
+            stats = _timers[self.name]
+            stats[0] += 1
+            stats[1] += elapsed
+            stats[2] = max(stats[2], elapsed)
+            if exc_type is not None:
+                _counters[f"{self.name}.error"] += 1
+            # perf_counter is the system-wide monotonic clock, so worker events line up
+            event = {"name": self.name, "ph": "X", "ts": round(self.start * 1e6, 1),
+                     "dur": round(elapsed * 1e6, 1)}
+            if self.args:
+                event["args"] = self.args
+            _emit(event)
+        return False
+
+def span(name, **args):
+    """Context manager timing the enclosed block as stage ``name``"""
+    if not _enabled:
+        return _NULL
+    return _Span(name, args)
+
+def count(name, n=1):
+    """Adds ``n`` to counter ``name``"""
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] += n
+        _emit({"name": name, "ph": "C", "ts": round(time.perf_counter() * 1e6, 1),
+               "args": {"value": _counters[name]}})
+
+def snapshot():
+    """``{"timers": {name: {count, total_ms, mean_ms, max_ms}}, "counters": {...}}``"""
+    with _lock:
+        timers = {name: {"count": c, "total_ms": round(total * 1000, 3),
+                         "mean_ms": round(total * 1000 / c, 3) if c else 0.0,
+                         "max_ms": round(peak * 1000, 3)}
+                  for name, (c, total, peak) in _timers.items()}
+        return {"timers": timers, "counters": dict(_counters)}
+
+def subscribe(callback):
+    _subscribers.append(callback)
+
+def unsubscribe(callback):
+    if callback in _subscribers:
+        _subscribers.remove(callback)
+
+def publish():
+    """Sends the current snapshot to every subscriber; returns it (None while disabled)"""
+    if not _enabled:
+        return None
+    snap = snapshot()
+    for callback in list(_subscribers):
+        callback(snap)
+    return snap
+
+def format_snapshot(snap):
+    lines = [f"{name:<12} {t['count']:>6} x {t['mean_ms']:>9.2f} ms  (max {t['max_ms']:.2f}, total {t['total_ms']:.0f})"
+             for name, t in sorted(snap["timers"].items())]
+    lines += [f"{name:<12} {value:>6}" for name, value in sorted(snap["counters"].items())]
+    return "\n".join(lines)
+
+if os.environ.get(TRACE_ENV):
+    # "1" collects timings without a trace file
+    enable(None if os.environ[TRACE_ENV] == "1" else os.environ[TRACE_ENV])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""Per-session result store with running statistics.
+
+Results live in preallocated NumPy columns that grow by doubling, and the
+mean/variance/min/max are updated in O(1) per result (Welford), so neither
+appending nor reading the summary depends on how many samples were scored.
+"""
+
+import csv
+import json
+import math
+import time
+
+import numpy as np
+
+FIELDS = ["index", "path", "match_rate", "seconds"]
+
+class ResultStore:
+    """Append-only ``(index, path, match_rate, seconds)`` rows.
+
+    ``seconds`` is the time from ``start()`` (or the first result) until the
+    row was added.
+    """
+
+    def __init__(self, capacity=256):
+        self._index = np.empty(capacity, np.int32)
+        self._rate = np.empty(capacity, np.float32)
+        self._seconds = np.empty(capacity, np.float32)
+        self.paths = []
+        self.clear()
+
+    def clear(self):
+        self.paths.clear()
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+        self.started = None
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def _grow(self):
+        capacity = 2 * len(self._rate)
+        for name in ("_index", "_rate", "_seconds"):
+            column = getattr(self, name)
+            grown = np.empty(capacity, column.dtype)
+            grown[:self.count] = column[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, index, path, rate, seconds=None):
+        if self.started is None:
+            self.start()
+        if self.count == len(self._rate):
+            self._grow()
+        n = self.count
+        self._index[n] = index
+        self._rate[n] = rate
+        self._seconds[n] = time.perf_counter() - self.started if seconds is None else seconds
+        self.paths.append(path)
+        self.count = n + 1
+        delta = rate - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (rate - self.mean)
+        self.min = min(self.min, rate)
+        self.max = max(self.max, rate)
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def indices(self):
+        return self._index[:self.count]
+
+    @property
+    def rates(self):
+        return self._rate[:self.count]
+
+    @property
+    def seconds(self):
+        return self._seconds[:self.count]
+
+    def rows(self, start=0, stop=None):
+        """``(index, path, match_rate, seconds)`` tuples for rows ``[start, stop)``"""
+        stop = self.count if stop is None else min(stop, self.count)
+        for n in range(start, stop):
+            yield int(self._index[n]), self.paths[n], float(self._rate[n]), float(self._seconds[n])
+
+    def summary(self):
+        if not self.count:
+            return {"count": 0}
+        return {"count": self.count, "mean": self.mean, "std": self.std,
+                "min": self.min, "max": self.max}
+
+    def to_csv(self, path):
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(FIELDS)
+            for index, p, rate, seconds in self.rows():
+                writer.writerow([index, p, f"{rate:.4f}", f"{seconds:.4f}"])
+
+    def to_json(self, path):
+        with open(path, "w") as f:
+            json.dump({"summary": self.summary(),
+                       "results": [dict(zip(FIELDS, row)) for row in self.rows()]}, f, indent=1)
+
+    def export(self, path):
+        """Writes ``.json`` files as JSON and anything else as CSV"""
+        (self.to_json if path.lower().endswith(".json") else self.to_csv)(path)
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""Shared priority scheduler for background work.
+
+Every long-running action (recording, analysis, bulk conversion) is a task on
+one small pool of threads instead of a thread of its own, so overlapping user
+actions queue up rather than oversubscribing the CPU. Tasks run in priority
+order, ``LIVE`` > ``INFERENCE`` > ``CONVERSION``, and one extra worker is
+reserved for ``LIVE`` so a recording never waits behind a long analysis.
+
+Lower-priority work that runs in a loop calls ``yield_to(priority)`` between
+files: it returns once no higher-priority task is running. Each task
+may carry a ``CancelToken`` that it checks at the same points; a task
+cancelled before it starts never runs. ``submit`` applies back-pressure by
+blocking (or raising ``queue.Full``) once ``max_pending`` non-live tasks wait.
+"""
+
+import collections
+import heapq
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+
+LIVE, INFERENCE, CONVERSION = 0, 1, 2
+DEFAULT_WORKERS = 2
+MAX_PENDING = 64
+
+_SCHEDULER = None
+_SCHEDULER_LOCK = threading.Lock()
+
+class Cancelled(Exception):
+    """Raised by ``CancelToken.raise_if_cancelled``"""
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+
+    def cancel(self):
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+class TaskScheduler:
+    def __init__(self, max_workers=DEFAULT_WORKERS, max_pending=MAX_PENDING, reserved_live=1):
+        self.max_pending = max_pending
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._queued = collections.Counter()
+        self._running = collections.Counter()
+        self._shutdown = False
+        self._threads = [threading.Thread(target=self._worker, args=(False,), daemon=True)
+                         for _ in range(max_workers)]
+        self._threads += [threading.Thread(target=self._worker, args=(True,), daemon=True)
+                          for _ in range(reserved_live)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, fn, *args, priority=CONVERSION, token=None, block=True, timeout=None, **kwargs):
+        """Queues ``fn(*args, **kwargs)``; returns a ``concurrent.futures.Future``"""
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Scheduler has been shut down.")
+            if priority > LIVE:
+                has_room = lambda: self._shutdown or self._pending() < self.max_pending
+                if not self._cond.wait_for(has_room, timeout if block else 0):
+                    raise queue.Full()
+            heapq.heappush(self._heap, (priority, next(self._seq), future, fn, args, kwargs, token))
+            self._queued[priority] += 1
+            self._cond.notify_all()
+        return future
+
+    def _pending(self):
+        return sum(n for p, n in self._queued.items() if p > LIVE)
+
+    def _worker(self, live_only):
+        while True:
+            with self._cond:
+                ready = lambda: self._heap and (not live_only or self._heap[0][0] == LIVE)
+                self._cond.wait_for(lambda: self._shutdown or ready())
+                if not ready():
+                    return
+                priority, _, future, fn, args, kwargs, token = heapq.heappop(self._heap)
+                self._queued[priority] -= 1
+                self._running[priority] += 1
+                self._cond.notify_all()
+            try:
+                if token is not None and token.cancelled:
+                    future.cancel()
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(fn(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self._cond:
+                    self._running[priority] -= 1
+                    self._cond.notify_all()
+
+    def busy(self, priority):
+        """True while a task more urgent than ``priority`` runs, or a ``LIVE`` one waits"""
+        with self._cond:
+            return self._busy(priority)
+
+    def _busy(self, priority):
+        # Queued non-live work may need the very worker that is yielding, so only
+        # running tasks count; live tasks always have their reserved worker
+        if priority > LIVE and self._queued[LIVE]:
+            return True
+        return any(self._running[p] for p in range(priority))
+
+    def yield_to(self, priority, token=None, poll=0.1):
+        """Blocks while more urgent work is active; returns False if ``token`` got cancelled"""
+        with self._cond:
+            while self._busy(priority):
+                if token is not None and token.cancelled:
+                    return False
+                self._cond.wait(poll)
+        return not (token is not None and token.cancelled)
+
+    def stats(self):
+        with self._cond:
+            return {"queued": dict(self._queued), "running": dict(self._running)}
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_pending:
+                for item in self._heap:
+                    item[2].cancel()
+                self._heap.clear()
+                self._queued.clear()
+            self._cond.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+def get_scheduler():
+    """The process-wide scheduler, created on first use"""
+    global _SCHEDULER
+    with _SCHEDULER_LOCK:
+        if _SCHEDULER is None:
+            _SCHEDULER = TaskScheduler()
+        return _SCHEDULER
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Persistent match-rate store so repeated inputs skip the model.
+
+Scores live in a local SQLite database keyed by
+
+    content   SHA-256 of the input file (recording or spectrogram image)
+    params    preprocessing parameters (STFT settings and model input size)
+    model     SHA-256 of the model file that produced the score
+
+so changing any of the three simply stops old rows from matching. Rows of a
+model file that has since changed are pruned when the store is opened for it.
+Lookups for a whole session are one indexed ``IN`` query and new scores are
+written with one ``executemany`` per transaction.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from core.cache import file_digest
+from core.inference import MODEL_BACKEND, backend_path
+from core.profiling import count, span
+from core.spectrogram import IMG_SIZE, STFT_PARAMS
+
+STORE_PATH = os.path.join("data", "scores.sqlite3")
+# Stays below SQLITE_MAX_VARIABLE_NUMBER on older SQLite builds
+MAX_VARIABLES = 900
+
+PARAMS = dict(STFT_PARAMS, img_size=IMG_SIZE)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scores (
+    content TEXT NOT NULL,
+    params TEXT NOT NULL,
+    model TEXT NOT NULL,
+    backend TEXT NOT NULL,
+    match_rate REAL NOT NULL,
+    created REAL NOT NULL,
+    PRIMARY KEY (content, params, model)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS scores_backend ON scores (backend, model);
+"""
+
+_STORES = {}
+_STORES_LOCK = threading.Lock()
+
+class ScoreStore:
+    """Match rates of previously scored files for one model file.
+
+    ``lookup(paths)`` returns ``{path: match_rate}`` for the paths already
+    scored and ``put_many(pairs)`` records fresh ones. File digests are memoised
+    per ``(path, mtime, size)``, so a file is hashed once per process unless it
+    changes on disk.
+    """
+
+    def __init__(self, path=STORE_PATH, backend=None, params=PARAMS):
+        self.path = path
+        self.backend = backend or MODEL_BACKEND
+        self.params = json.dumps(params, sort_keys=True)
+        self.model = file_digest(backend_path(self.backend))
+        self._digests = {}
+        self._lock = threading.Lock()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Shared between the analysis task and pipeline threads, serialised by _lock
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        with self._lock, self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(_SCHEMA)
+            self._conn.execute("DELETE FROM scores WHERE backend = ? AND model != ?",
+                               (self.backend, self.model))
+
+    def digest(self, path):
+        """Content hash of ``path``, None when it can't be read"""
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._digests.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        try:
+            digest = file_digest(path)
+        except OSError:
+            return None
+        self._digests[path] = (stamp, digest)
+        return digest
+
+    def lookup(self, paths):
+        with span("scores.lookup", files=len(paths)):
+            digests = {}
+            for path in paths:
+                digest = self.digest(path)
+                if digest:
+                    digests.setdefault(digest, []).append(path)
+            found = {}
+            keys = list(digests)
+            with self._lock:
+                for start in range(0, len(keys), MAX_VARIABLES):
+                    chunk = keys[start:start + MAX_VARIABLES]
+                    rows = self._conn.execute(
+                        f"SELECT content, match_rate FROM scores WHERE params = ? AND model = ?"
+                        f" AND content IN ({','.join('?' * len(chunk))})",
+                        [self.params, self.model, *chunk])
+                    for content, rate in rows:
+                        for path in digests[content]:
+                            found[path] = rate
+        count("scores.hit", len(found))
+        count("scores.miss", len(paths) - len(found))
+        return found
+
+    def put_many(self, pairs):
+        """Records ``(path, match_rate)`` pairs in one transaction"""
+        now = time.time()
+        rows = [(digest, self.params, self.model, self.backend, float(rate), now)
+                for digest, rate in ((self.digest(p), r) for p, r in pairs) if digest]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO scores VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scores WHERE model = ?",
+                                      (self.model,)).fetchone()[0]
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM scores")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def get_score_store(backend=None, path=STORE_PATH):
+    """The store for ``backend``'s current model file, reopened when that file changes"""
+    backend = backend or MODEL_BACKEND
+    model_path = backend_path(backend)
+    st = os.stat(model_path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _STORES_LOCK:
+        entry = _STORES.get((backend, path))
+        if entry is None or entry[0] != stamp:
+            if entry is not None:
+                entry[1].close()
+            entry = _STORES[(backend, path)] = (stamp, ScoreStore(path, backend))
+        return entry[1]
+
+def iter_cached_predictions(inputs, batch_size, predictions, store=None, paths=None, known=None):
+    """``predictions(inputs, batch_size)`` answered from known scores where possible.
+
+    Yields ``(index, match_rate)`` in input order like ``iter_predictions``.
+    ``known`` maps paths to scores already at hand, e.g. a running session's
+    results; it is copied once up front, so it may keep changing underneath.
+    Paths not in it are looked up in ``store``, only the rest reach
+    ``predictions``, and their scores are written back to ``store`` in one
+    transaction per model batch. ``paths`` names the file each input was made
+    from (default: the inputs that are paths).
+    """
+    inputs = list(inputs)
+    if paths is None:
+        paths = [item if isinstance(item, str) else None for item in inputs]
+    known = dict(known or {})
+    if store is not None:
+        known.update(store.lookup([p for p in paths if p and p not in known]))
+    missing = [i for i, p in enumerate(paths) if p not in known]
+    fresh = ((missing[j], rate) for j, rate in
+             predictions([inputs[i] for i in missing], batch_size)) if missing else iter(())
+    new = []
+    try:
+        nxt = next(fresh, None)
+        for i, path in enumerate(paths):
+            if path in known:
+                yield i, known[path]
+            elif nxt and nxt[0] == i:
+                yield nxt
+                if path:
+                    new.append((path, nxt[1]))
+                if store is not None and len(new) >= batch_size:
+                    store.put_many(new)
+                    new = []
+                nxt = next(fresh, None)
+    finally:
+        # also keeps what was scored before a cancelled consumer stopped early
+        if store is not None and new:
+            store.put_many(new)
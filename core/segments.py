@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""Sliding-window scoring of a recording with a per-segment timeline.
+
+The STFT is computed once for the whole clip and every window is a column
+slice of it, so overlapping segments never redo FFT work. Each slice is
+normalised to its own maximum and scored as if it were a standalone clip.
+With silence trimming enabled, windows without a single active frame are not
+scored at all and show up in the timeline without a match rate.
+"""
+
+import numpy as np
+
+from core.inference import DEFAULT_BATCH_SIZE, iter_predictions
+from core.spectrogram import (HOP_LENGTH, TRIM_SILENCE, amplitude_to_db, compute_magnitude,
+                              frame_activity, load_audio, spectrogram_to_tensor)
+
+SEGMENT_SECONDS = 3.0
+SEGMENT_OVERLAP = 0.5
+TOP_K = 3
+
+def segment_bounds(n_frames, sr, seconds=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP):
+    """``[(start_frame, end_frame)]`` windows covering all frames, the last one flush with the end"""
+    width = max(1, int(round(seconds * sr / HOP_LENGTH)))
+    if n_frames <= width:
+        return [(0, n_frames)]
+    step = max(1, int(round(width * (1 - overlap))))
+    starts = list(range(0, n_frames - width + 1, step))
+    if starts[-1] + width < n_frames:
+        starts.append(n_frames - width)
+    return [(s, s + width) for s in starts]
+
+def summarize(rates, top_k=TOP_K):
+    rates = np.asarray([r for r in rates if r is not None], dtype=np.float64)
+    if not len(rates):
+        return {"mean": None, "max": None, "top_k_mean": None}
+    return {"mean": float(rates.mean()), "max": float(rates.max()),
+            "top_k_mean": float(np.sort(rates)[-top_k:].mean())}
+
+def score_segments(mag, sr, seconds=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP,
+                   top_k=TOP_K, batch_size=DEFAULT_BATCH_SIZE, active=None):
+    """Scores the windows of a precomputed STFT magnitude.
+
+    ``active`` optionally masks the frames worth scoring; windows without any
+    are skipped. Returns the aggregate statistics plus a ``timeline`` of
+    ``{"start", "end", "match_rate"}`` entries in seconds.
+    """
+    bounds = segment_bounds(mag.shape[1], sr, seconds, overlap)
+    if active is None:
+        scored = list(range(len(bounds)))
+    else:
+        runs = np.concatenate(([0], np.cumsum(active)))
+        scored = [i for i, (s, e) in enumerate(bounds) if runs[e] > runs[s]]
+    tensors = (spectrogram_to_tensor(amplitude_to_db(mag[:, bounds[i][0]:bounds[i][1]])) for i in scored)
+    rates = [None] * len(bounds)
+    for j, rate in iter_predictions(tensors, batch_size):
+        rates[scored[j]] = rate
+    timeline = [{"start": s * HOP_LENGTH / sr, "end": e * HOP_LENGTH / sr, "match_rate": r}
+                for (s, e), r in zip(bounds, rates)]
+    return dict(summarize(rates, top_k), segments=len(bounds), silent=len(bounds) - len(scored),
+                timeline=timeline)
+
+def analyze_segments(file_path, seconds=SEGMENT_SECONDS, overlap=SEGMENT_OVERLAP,
+                     top_k=TOP_K, batch_size=DEFAULT_BATCH_SIZE, trim=TRIM_SILENCE):
+    y, sr = load_audio(file_path)
+    # Trimming here would shift the timeline, so silent windows are skipped instead
+    active = frame_activity(y) if trim else None
+    return score_segments(compute_magnitude(y), sr, seconds, overlap, top_k, batch_size, active)
@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+"""Shared local inference service with dynamic request batching.
+
+    python -m core.server --listen 127.0.0.1:8765 --max-batch 32 --max-wait-ms 10
+    python -m core.server --listen unix:/tmp/covid-infer.sock
+
+One process holds the model; requests from any number of clients are pooled
+into batches of up to ``max_batch`` samples, waiting at most ``max_wait_ms``
+for a batch to fill. The wire format is one JSON object per line:
+
+    {"id": 1, "path": "/abs/spectrogram.jpg"}          -> {"id": 1, "match_rate": 12.3}
+    {"id": 2, "tensor": "<base64 float32 224x224x3>"}  -> {"id": 2, "match_rate": 45.6}
+    {"id": 3, "op": "metrics"}                         -> {"id": 3, "metrics": {...}}
+
+Path requests are read from the server's own filesystem, so clients only send
+them over a unix socket; across the network they preprocess locally and send
+tensors. Desktop instances use it by setting ``COVID_INFERENCE_SERVER`` to the
+address, in which case they never load TensorFlow themselves.
+"""
+
+import argparse
+import asyncio
+import base64
+import collections
+import json
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from core.inference import DEFAULT_BATCH_SIZE, IMG_SIZE, get_backend, load_input, to_match_rate
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+INFERENCE_SERVER = os.environ.get("COVID_INFERENCE_SERVER")
+MAX_WAIT_MS = 10
+TENSOR_SHAPE = (IMG_SIZE, IMG_SIZE, 3)
+# A base64 float32 tensor is ~800 KB, well past asyncio's default line limit
+LINE_LIMIT = 4 * 1024 * 1024
+
+def parse_address(address):
+    """``unix:/path`` -> ``("unix", path)``; ``host:port`` -> ``("tcp", (host, port))``"""
+    if address.startswith("unix:"):
+        return "unix", address[len("unix:"):]
+    host, _, port = address.rpartition(":")
+    return "tcp", (host or "127.0.0.1", int(port))
+
+class DynamicBatcher:
+    """Collects submitted tensors into batches and runs them on a single model thread"""
+
+    def __init__(self, backend, max_batch=DEFAULT_BATCH_SIZE, max_wait_ms=MAX_WAIT_MS):
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue = asyncio.Queue()
+        self.requests = 0
+        self.batches = 0
+        self.latencies = collections.deque(maxlen=1000)
+        self.batch_sizes = collections.deque(maxlen=1000)
+        self._model_thread = ThreadPoolExecutor(max_workers=1)
+
+    async def submit(self, tensor):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((tensor, future, time.perf_counter()))
+        return await future
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            x = np.stack([tensor for tensor, _, _ in batch])
+            try:
+                res = await loop.run_in_executor(self._model_thread, self.backend.predict, x)
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            now = time.perf_counter()
+            for (_, future, start), r in zip(batch, res):
+                if not future.done():
+                    future.set_result(to_match_rate(r))
+                self.latencies.append(now - start)
+            self.requests += len(batch)
+            self.batches += 1
+            self.batch_sizes.append(len(batch))
+
+    def metrics(self):
+        lat = sorted(self.latencies)
+        pct = lambda p: round(lat[min(len(lat) - 1, int(p * len(lat)))] * 1000, 3) if lat else None
+        return {"queue_depth": self.queue.qsize(), "requests": self.requests, "batches": self.batches,
+                "mean_batch": round(float(np.mean(self.batch_sizes)), 2) if self.batch_sizes else None,
+                "latency_ms_p50": pct(0.5), "latency_ms_p95": pct(0.95)}
+
+class InferenceServer:
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle(self, reader, writer):
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                task = asyncio.create_task(self._respond(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            writer.close()
+
+    async def _respond(self, line, writer, lock):
+        req_id = None
+        try:
+            req = json.loads(line)
+            req_id = req.get("id")
+            if req.get("op") == "metrics":
+                reply = {"metrics": self.batcher.metrics()}
+            else:
+                tensor = await asyncio.get_running_loop().run_in_executor(None, self._decode, req)
+                if tensor is None:
+                    reply = {"error": "unreadable input"}
+                else:
+                    reply = {"match_rate": await self.batcher.submit(tensor)}
+        except Exception as e:
+            reply = {"error": str(e) or type(e).__name__}
+        reply["id"] = req_id
+        async with lock:
+            writer.write((json.dumps(reply) + "\n").encode())
+            await writer.drain()
+
+    @staticmethod
+    def _decode(req):
+        if "tensor" in req:
+            return np.frombuffer(base64.b64decode(req["tensor"]), np.float32).reshape(TENSOR_SHAPE)
+        return load_input(req["path"])
+
+async def serve(address=DEFAULT_ADDRESS, backend=None, max_batch=DEFAULT_BATCH_SIZE,
+                max_wait_ms=MAX_WAIT_MS):
+    batcher = DynamicBatcher(get_backend(backend), max_batch, max_wait_ms)
+    server = InferenceServer(batcher)
+    kind, where = parse_address(address)
+    if kind == "unix":
+        if os.path.exists(where):
+            os.remove(where)
+        listener = await asyncio.start_unix_server(server.handle, path=where, limit=LINE_LIMIT)
+    else:
+        listener = await asyncio.start_server(server.handle, *where, limit=LINE_LIMIT)
+    print(f"Serving {address} (max batch {max_batch}, max wait {max_wait_ms} ms)", flush=True)
+    async with listener:
+        await asyncio.gather(listener.serve_forever(), batcher.run())
+
+class InferenceClient:
+    """Blocking client used in place of in-process inference"""
+
+    def __init__(self, address=None, timeout=60):
+        kind, where = parse_address(address or INFERENCE_SERVER or DEFAULT_ADDRESS)
+        # Only a unix socket guarantees the server sees the same files
+        self.send_paths = kind == "unix"
+        family = socket.AF_UNIX if kind == "unix" else socket.AF_INET
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(where)
+        self.reader = self.sock.makefile('rb')
+        self._next_id = 0
+
+    def _send(self, payload):
+        self._next_id += 1
+        payload["id"] = self._next_id
+        self.sock.sendall((json.dumps(payload) + "\n").encode())
+        return self._next_id
+
+    def _recv(self):
+        line = self.reader.readline()
+        if not line:
+            raise ConnectionError("Inference server closed the connection.")
+        return json.loads(line)
+
+    def metrics(self):
+        req_id = self._send({"op": "metrics"})
+        reply = self._recv()
+        while reply.get("id") != req_id:
+            reply = self._recv()
+        return reply["metrics"]
+
+    def iter_predictions(self, inputs, batch_size=DEFAULT_BATCH_SIZE):
+        """Same contract as ``core.inference.iter_predictions``, served remotely.
+
+        Unreadable inputs are skipped, but a run where none of them could be
+        read raises instead of silently returning nothing.
+        """
+        window = []
+        total = scored = 0
+        for i, item in enumerate(inputs):
+            total += 1
+            if isinstance(item, str) and not self.send_paths:
+                item = load_input(item)
+                if item is None:
+                    continue
+            if isinstance(item, np.ndarray):
+                data = base64.b64encode(np.ascontiguousarray(item, np.float32).tobytes()).decode()
+                window.append((self._send({"tensor": data}), i))
+            else:
+                window.append((self._send({"path": os.path.abspath(item)}), i))
+            if len(window) >= batch_size:
+                for result in self._collect(window):
+                    scored += 1
+                    yield result
+                window = []
+        for result in self._collect(window):
+            scored += 1
+            yield result
+        if total and not scored:
+            raise RuntimeError(f"None of the {total} input(s) could be read.")
+
+    def _collect(self, window):
+        pending = dict(window)
+        replies = {}
+        while len(replies) < len(pending):
+            reply = self._recv()
+            if reply.get("id") in pending:
+                replies[reply["id"]] = reply
+        for req_id, i in window:
+            reply = replies[req_id]
+            if "match_rate" in reply:
+                yield i, reply["match_rate"]
+            elif reply.get("error") != "unreadable input":
+                raise RuntimeError(reply.get("error"))
+
+    def close(self):
+        self.reader.close()
+        self.sock.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.server", description=__doc__.splitlines()[0])
+    parser.add_argument("--listen", default=DEFAULT_ADDRESS, help="host:port or unix:/path")
+    parser.add_argument("--backend", default=None, help="inference backend (default: COVID_MODEL_BACKEND)")
+    parser.add_argument("--max-batch", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.listen, args.backend, args.max_batch, args.max_wait_ms))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
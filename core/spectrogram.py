@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+import os
+import cv2
+import numpy as np
+
+from core.cache import SpectrogramCache
+from core.decode import TARGET_SR, audio_length, decode_audio
+from core.profiling import count, span
+from core.stft import StftEngine
+
+# librosa and matplotlib are imported on first use: together they cost seconds
+# of startup that the GUI should not pay before its window appears.
+
+N_FFT = 1024
+HOP_LENGTH = 512
+TOP_DB = 80.0
+CMAP = "nipy_spectral"
+IMG_SIZE = 224
+# Pixel size (w, h) of the default matplotlib canvas the JPEG path renders to
+RENDER_SIZE = (640, 480)
+
+AUDIO_EXTS = ('.wav', '.mp3', '.ogg', '.flac', '.m4a', '.aiff')
+IMG_EXTS = ('.jpg', '.png', '.jpeg')
+
+# Optional silence trimming before the STFT: "" keeps whole clips, "crop" cuts
+# leading/trailing silence, "concat" also drops the quiet gaps between coughs
+TRIM_SILENCE = os.environ.get("COVID_TRIM_SILENCE", "")
+TRIM_MODES = ("crop", "concat")
+# Frames this far below the loudest one count as silence
+TRIM_TOP_DB = 40.0
+# Seconds kept around each active region, and shortest gap that is dropped
+TRIM_PAD = 0.1
+TRIM_MIN_GAP = 0.3
+
+# Everything that changes the cached dB spectrogram or its rendering
+STFT_PARAMS = {"n_fft": N_FFT, "hop_length": HOP_LENGTH, "window": "hann", "cmap": CMAP,
+               "sr": TARGET_SR}
+if TRIM_SILENCE:
+    STFT_PARAMS["trim"] = {"mode": TRIM_SILENCE, "top_db": TRIM_TOP_DB, "pad": TRIM_PAD,
+                           "min_gap": TRIM_MIN_GAP}
+
+_CMAP_LUT = None
+_CACHE = None
+_ENGINE = None
+
+def load_audio(file_path, mmap=False):
+    """Mono float32 samples, resampled to ``TARGET_SR`` when one is configured"""
+    with span("load"):
+        return decode_audio(file_path, TARGET_SR, mmap)
+
+def get_engine():
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = StftEngine(N_FFT, HOP_LENGTH, TOP_DB)
+    return _ENGINE
+
+def frame_activity(y, top_db=TRIM_TOP_DB):
+    """Boolean mask of the STFT frames whose RMS is within ``top_db`` of the loudest"""
+    rms = get_engine().frame_rms(y)
+    peak = rms.max() if len(rms) else 0.0
+    if peak <= 0:
+        return np.zeros(len(rms), bool)
+    return rms > peak * 10 ** (-top_db / 20)
+
+def active_regions(y, sr, top_db=TRIM_TOP_DB, pad=TRIM_PAD, min_gap=TRIM_MIN_GAP):
+    """``(starts, stops)`` sample arrays of the active parts of ``y``.
+
+    Runs of active frames are widened by ``pad`` seconds and runs separated by
+    less than ``min_gap`` seconds are merged. Both arrays are empty for silence.
+    """
+    active = frame_activity(y, top_db)
+    edges = np.flatnonzero(np.diff(active.astype(np.int8), prepend=0, append=0))
+    # Frame i covers samples [i * hop - n_fft / 2, i * hop + n_fft / 2)
+    starts = edges[0::2] * HOP_LENGTH - N_FFT // 2 - int(pad * sr)
+    stops = (edges[1::2] - 1) * HOP_LENGTH + N_FFT // 2 + int(pad * sr)
+    np.clip(starts, 0, len(y), out=starts)
+    np.clip(stops, 0, len(y), out=stops)
+    if len(starts) > 1:
+        split = starts[1:] - stops[:-1] >= int(min_gap * sr)
+        starts = starts[np.r_[True, split]]
+        stops = stops[np.r_[split, True]]
+    return starts, stops
+
+def trim_silence(y, sr, mode=None):
+    """Drops silence before the STFT; returns ``(samples, seconds_trimmed)``.
+
+    ``mode`` is one of ``TRIM_MODES``, default ``TRIM_SILENCE``; a falsy mode
+    or an all-silent clip leaves ``y`` untouched.
+    """
+    mode = TRIM_SILENCE if mode is None else mode
+    if not mode:
+        return y, 0.0
+    if mode not in TRIM_MODES:
+        raise ValueError(f"Unknown trim mode '{mode}', expected one of {TRIM_MODES}.")
+    with span("trim"):
+        starts, stops = active_regions(y, sr)
+        if not len(starts):
+            return y, 0.0
+        if mode == "crop":
+            out = y[starts[0]:stops[-1]]
+        else:
+            out = np.concatenate([y[a:b] for a, b in zip(starts, stops)])
+    count("trim.in_ms", int(len(y) * 1000 / sr))
+    count("trim.cut_ms", int((len(y) - len(out)) * 1000 / sr))
+    return out, (len(y) - len(out)) / sr
+
+def load_trimmed_audio(file_path):
+    """``load_audio`` then ``trim_silence``; returns ``(y, sr, seconds_trimmed)``"""
+    y, sr = load_audio(file_path)
+    y, trimmed = trim_silence(y, sr)
+    return y, sr, trimmed
+
+def trimmed_seconds(file_path, db):
+    """Seconds silence trimming cut from ``file_path``, given its (possibly cached) ``db``.
+
+    Derived from the file header and the spectrogram width, so exact to one
+    hop; None when trimming is off or the header can't be read.
+    """
+    if not TRIM_SILENCE:
+        return None
+    try:
+        sr, samples = audio_length(file_path)
+    except RuntimeError:
+        return None
+    frames = 1 + samples // HOP_LENGTH
+    return max(0, frames - db.shape[1]) * HOP_LENGTH / sr
+
+def compute_magnitude(y):
+    """Scaled STFT magnitude, ``(n_fft // 2 + 1, frames)``"""
+    with span("stft"):
+        return get_engine().magnitude(y)
+
+def compute_spectrogram_db(y):
+    """STFT magnitude in dB relative to the clip maximum"""
+    with span("stft"):
+        return get_engine().db(y)
+
+def compute_spectrograms_db(clips):
+    """``compute_spectrogram_db`` for many clips through one batched STFT"""
+    with span("stft", clips=len(clips)):
+        return get_engine().batch_db(clips)
+
+def amplitude_to_db(S, ref=None, amin=1e-5, top_db=TOP_DB):
+    """NumPy equivalent of ``librosa.amplitude_to_db``, ``ref`` defaulting to the max"""
+    ref = np.max(S) if ref is None else ref
+    db = 20.0 * np.log10(np.maximum(amin, S)) - 20.0 * np.log10(max(amin, ref))
+    return np.maximum(db, db.max() - top_db)
+
+def get_cache():
+    global _CACHE
+    if _CACHE is None:
+        _CACHE = SpectrogramCache(STFT_PARAMS)
+    return _CACHE
+
+def load_spectrogram_db(file_path, cache=None):
+    """dB spectrogram of a file through the cache; returns ``(db, key)``"""
+    cache = cache or get_cache()
+    key = cache.key(file_path)
+    db = cache.get(key)
+    count("cache.hit" if db is not None else "cache.miss")
+    if db is None:
+        y, _, _ = load_trimmed_audio(file_path)
+        db = compute_spectrogram_db(y)
+        cache.put(key, db)
+    return db, key
+
+def load_spectrograms_db(file_paths, cache=None):
+    """Batched ``load_spectrogram_db``; ``(db, key)`` per file, None where decoding failed"""
+    cache = cache or get_cache()
+    results = [None] * len(file_paths)
+    missing, clips = [], []
+    for i, path in enumerate(file_paths):
+        try:
+            key = cache.key(path)
+        except OSError:
+            continue
+        db = cache.get(key)
+        count("cache.hit" if db is not None else "cache.miss")
+        if db is not None:
+            results[i] = (db, key)
+            continue
+        try:
+            clips.append(load_trimmed_audio(path)[0])
+        except Exception:
+            count("errors")
+            continue
+        missing.append((i, key))
+    for (i, key), db in zip(missing, compute_spectrograms_db(clips) if clips else []):
+        cache.put(key, db)
+        results[i] = (db, key)
+    return results
+
+def spectrogram_image_path(file_path, key=None):
+    """Image path under data/, suffixed with the cache key so equal basenames don't collide"""
+    os.makedirs("data", exist_ok=True)
+    name = os.path.basename(file_path)
+    if key:
+        name = f"{name}.{key[:12]}"
+    return os.path.join("data", name + ".jpg")
+
+def render_spectrogram(db, output_img):
+    """Matplotlib rendering of a dB spectrogram to an image file"""
+    import matplotlib
+    matplotlib.use('Agg')
+    import librosa.display
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
+    with span("render"):
+        fig = Figure()
+        canvas = FigureCanvas(fig)
+        ax = fig.add_subplot(111)
+        librosa.display.specshow(db, ax=ax, cmap=CMAP)
+        ax.axis('off')
+        fig.tight_layout(pad=0)
+        fig.savefig(output_img, bbox_inches='tight', pad_inches=0)
+        return output_img
+
+def _colormap_lut():
+    global _CMAP_LUT
+    if _CMAP_LUT is None:
+        import matplotlib
+        cmap = matplotlib.colormaps[CMAP]
+        _CMAP_LUT = np.round(cmap(np.arange(cmap.N))[:, :3] * 255).astype(np.uint8)
+    return _CMAP_LUT
+
+def spectrogram_to_rgb(db, save_path=None):
+    """Colour-maps a dB spectrogram straight into a (224, 224, 3) uint8 RGB image.
+
+    Mirrors ``render_spectrogram`` without matplotlib: values are normalised to the
+    clip range, quantised into the colormap lookup table, laid out low frequencies
+    at the bottom and resampled like a rendered canvas read back by ``cv2``.
+    """
+    lut = _colormap_lut()
+    with span("render"):
+        lo, hi = float(db.min()), float(db.max())
+        scale = len(lut) / (hi - lo) if hi > lo else 0.0
+        idx = np.clip((db[::-1] - lo) * scale, 0, len(lut) - 1).astype(np.uint8)
+        idx = cv2.resize(idx, RENDER_SIZE, interpolation=cv2.INTER_NEAREST)
+        rgb = lut[idx]
+        if save_path:
+            cv2.imwrite(save_path, cv2.cvtColor(rgb, cv2.COLOR_RGB2BGR))
+        return cv2.resize(rgb, (IMG_SIZE, IMG_SIZE))
+
+def spectrogram_to_tensor(db, save_path=None):
+    """``spectrogram_to_rgb`` as the (224, 224, 3) float32 model input"""
+    return spectrogram_to_rgb(db, save_path).astype('float32') / 255
+
+def generate_spectrogram(file_path, cache=None):
+    """Heavy STFT processing logic separated for thread usage"""
+    db, key = load_spectrogram_db(file_path, cache)
+    return render_spectrogram(db, spectrogram_image_path(file_path, key))
+
+def generate_spectrogram_tensor(file_path, save_image=False, cache=None):
+    """In-memory variant of ``generate_spectrogram`` returning the model input.
+
+    Returns ``(tensor, img_path)``; the JPEG is only written when ``save_image``
+    is set, otherwise ``img_path`` is None.
+    """
+    db, key = load_spectrogram_db(file_path, cache)
+    img_path = spectrogram_image_path(file_path, key) if save_image else None
+    return spectrogram_to_tensor(db, img_path), img_path
+
+def read_image_rgb(img_path):
+    """Spectrogram image as (224, 224, 3) uint8 RGB, None if it can't be read"""
+    image = cv2.imread(img_path)
+    if image is None:
+        return None
+    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    return cv2.resize(image, (IMG_SIZE, IMG_SIZE))
+
+def preprocess_image(img_path):
+    """Reads a spectrogram image into the (224, 224, 3) float32 model input"""
+    with span("preprocess"):
+        image = read_image_rgb(img_path)
+        if image is None:
+            count("errors")
+            return None
+        return image.astype('float32') / 255
+
+def prepare_input(path):
+    """Model input for an audio file or spectrogram image, None if it can't be read"""
+    if path.lower().endswith(IMG_EXTS):
+        return preprocess_image(path)
+    return generate_spectrogram_tensor(path)[0]
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""Batched float32 STFT -> dB engine.
+
+Equivalent to ``librosa.stft(center=True, pad_mode="constant")`` followed by
+``librosa.amplitude_to_db(ref=np.max)``, but:
+
+* the window and its ``2 / sum(window)`` scale are computed once per engine;
+* clips are zero-padded into one ``(clips, samples)`` buffer and framed with a
+  strided view, so a whole batch goes through a single float32 ``rfft``. Padding
+  to the longest clip is exact: librosa pads with zeros as well, so the frames
+  of each clip are unchanged and the extra ones are simply not used;
+* magnitude, scaling, the per-clip reference and the ``top_db`` floor are
+  fused into one float32 pass over the spectrum (a Numba kernel when
+  available, NumPy otherwise); results are ``(bins, frames)`` transposed views.
+"""
+
+import numpy as np
+
+AMIN = 1e-5
+# Upper bound on samples framed at once, to keep the windowed copy in check
+MAX_BATCH_SAMPLES = 1 << 24
+# Relative length spread allowed within one padded batch
+BUCKET_SLACK = 0.1
+
+_KERNEL = None
+
+def _numba_kernel():
+    """Compiles the fused dB kernel on first use; None without Numba"""
+    global _KERNEL
+    if _KERNEL is None:
+        try:
+            from numba import njit, prange
+        except ImportError:
+            _KERNEL = False
+            return None
+
+        @njit(parallel=True, fastmath=True, cache=True)
+        def db_kernel(spec, nframes, scale2, amin2, top_db, out):
+            c = np.float32(10.0)
+            for b in prange(spec.shape[0]):
+                n = nframes[b]
+                peak = np.float32(0.0)
+                for f in range(n):
+                    for k in range(spec.shape[2]):
+                        v = spec[b, f, k]
+                        p = (v.real * v.real + v.imag * v.imag) * scale2
+                        out[b, f, k] = p
+                        peak = max(peak, p)
+                ref = c * np.log10(max(amin2, peak))
+                for f in range(n):
+                    for k in range(spec.shape[2]):
+                        out[b, f, k] = max(c * np.log10(max(amin2, out[b, f, k])) - ref, -top_db)
+
+        _KERNEL = db_kernel
+    return _KERNEL or None
+
+def _numpy_db(spec, nframes, scale2, amin2, top_db, out):
+    np.multiply(spec.real, spec.real, out=out)
+    out += spec.imag * spec.imag
+    out *= scale2
+    for b, n in enumerate(nframes):
+        p = out[b, :n]
+        ref = np.float32(10.0) * np.log10(max(amin2, p.max() if n else amin2))
+        np.maximum(p, amin2, out=p)
+        np.log10(p, out=p)
+        p *= np.float32(10.0)
+        p -= ref
+        np.maximum(p, -top_db, out=p)
+
+class StftEngine:
+    def __init__(self, n_fft, hop_length, top_db=80.0, amin=AMIN, use_numba=False, workers=None):
+        self.n_fft = n_fft
+        self.hop_length = hop_length
+        self.top_db = np.float32(top_db)
+        self.window = np.hanning(n_fft).astype(np.float32)
+        self.scale = np.float32(2 / np.sum(np.hanning(n_fft)))
+        self.amin2 = np.float32(amin * amin)
+        # The NumPy path vectorises log10; the Numba kernel pays off with many cores
+        self.use_numba = use_numba
+        # scipy.fft threads per batch; leave at 1 inside process pools
+        self.workers = workers
+
+    def frame_count(self, n_samples):
+        return 1 + n_samples // self.hop_length
+
+    def frames(self, clips):
+        """Strided ``(clips, frames, n_fft)`` view over one zero-padded buffer"""
+        pad = self.n_fft // 2
+        longest = max(len(y) for y in clips)
+        buf = np.zeros((len(clips), longest + 2 * pad), np.float32)
+        for row, y in zip(buf, clips):
+            row[pad:pad + len(y)] = y
+        view = np.lib.stride_tricks.sliding_window_view(buf, self.n_fft, axis=-1)
+        return view[:, ::self.hop_length][:, :self.frame_count(longest)]
+
+    def frame_rms(self, y):
+        """RMS of each (unwindowed) STFT frame of one clip, aligned with its spectrogram columns"""
+        frames = self.frames([np.asarray(y, np.float32)])[0]
+        return np.sqrt(np.einsum("ij,ij->i", frames, frames) / self.n_fft)
+
+    def spectrum(self, clips):
+        """Complex64 ``(clips, frames, bins)`` STFT and each clip's frame count"""
+        import scipy.fft
+        spec = scipy.fft.rfft(self.frames(clips) * self.window, axis=-1, workers=self.workers)
+        return spec, np.array([self.frame_count(len(y)) for y in clips], np.int64)
+
+    def magnitude(self, y):
+        """Scaled magnitude ``(bins, frames)`` of one clip"""
+        spec, _ = self.spectrum([y])
+        return np.abs(spec[0]).T * self.scale
+
+    def _db_batch(self, clips):
+        spec, nframes = self.spectrum(clips)
+        out = np.empty(spec.shape, np.float32)
+        kernel = _numba_kernel() if self.use_numba else None
+        (kernel or _numpy_db)(spec, nframes, np.float32(self.scale * self.scale), self.amin2,
+                              self.top_db, out)
+        # (frames, bins) rows are written contiguously; the transpose is a free view
+        return [out[b, :n].T for b, n in enumerate(nframes)]
+
+    def db(self, y):
+        """dB spectrogram of one clip, relative to its maximum"""
+        return self._db_batch([y])[0]
+
+    def batch_db(self, clips, max_samples=MAX_BATCH_SAMPLES, slack=BUCKET_SLACK):
+        """dB spectrograms of many clips, in input order.
+
+        Clips are sorted by length and batched while the longest stays within
+        ``slack`` of the shortest and the batch within ``max_samples``, so
+        little FFT work is spent on padding.
+        """
+        clips = [np.asarray(y, np.float32) for y in clips]
+        order = sorted(range(len(clips)), key=lambda i: len(clips[i]))
+        results = [None] * len(clips)
+        start = 0
+        while start < len(order):
+            limit = len(clips[order[start]]) * (1 + slack) + self.hop_length
+            stop = start + 1
+            while (stop < len(order) and len(clips[order[stop]]) <= limit
+                   and (stop - start + 1) * (len(clips[order[stop]]) + self.n_fft) <= max_samples):
+                stop += 1
+            group = order[start:stop]
+            for i, db in zip(group, self._db_batch([clips[i] for i in group])):
+                results[i] = db
+            start = stop
+        return results
+
+def librosa_db(y, n_fft, hop_length, top_db=80.0):
+    """The librosa reference the engine is checked against"""
+    import librosa
+    window = np.hanning(n_fft)
+    mag = 2 * np.abs(librosa.stft(y, n_fft=n_fft, hop_length=hop_length, window=window,
+                                  pad_mode="constant")) / np.sum(window)
+    return librosa.amplitude_to_db(mag, ref=np.max, top_db=top_db)
+
+def check_parity(engine, clips, tolerance=0.05):
+    """Max absolute dB difference between the engine and librosa; raises above ``tolerance``"""
+    worst = 0.0
+    for y, db in zip(clips, engine.batch_db(clips)):
+        ref = librosa_db(np.asarray(y, np.float32), engine.n_fft, engine.hop_length, float(engine.top_db))
+        if ref.shape != db.shape:
+            raise AssertionError(f"shape {db.shape} != librosa {ref.shape}")
+        worst = max(worst, float(np.max(np.abs(ref - db))))
+    if worst > tolerance:
+        raise AssertionError(f"STFT engine differs from librosa by {worst:.4f} dB (> {tolerance})")
+    return worst
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+"""Bounded-memory STFT for long recordings.
+
+Audio is read block by block with ``soundfile`` (WAV, FLAC, OGG, ...), brought
+to ``TARGET_SR`` by a stateful polyphase resampler when one is configured, and
+the STFT frames of each block are computed as soon as they are complete,
+carrying the ``n_fft - hop_length`` overlap over to the next block. Frames line
+up with ``librosa.stft(center=True)`` on the same samples ``load_audio``
+returns, so results match ``compute_spectrogram_db``.
+"""
+
+import math
+import numpy as np
+import soundfile as sf
+
+from core.decode import TARGET_SR, StreamResampler, audio_length
+from core.inference import DEFAULT_BATCH_SIZE, iter_predictions
+from core.spectrogram import N_FFT, HOP_LENGTH, amplitude_to_db, spectrogram_to_tensor
+
+BLOCK_FRAMES = 256
+MAX_COLUMNS = 2048
+
+def stft_frame_count(file_path):
+    return 1 + audio_length(file_path)[1] // HOP_LENGTH
+
+def iter_stft(file_path, block_frames=BLOCK_FRAMES):
+    """Yields ``(n_fft // 2 + 1, k)`` float32 magnitude blocks covering the whole file"""
+    window = np.hanning(N_FFT).astype(np.float32)
+    scale = np.float32(2 / np.sum(window))
+    info = sf.info(file_path)
+    resampler = None
+    if TARGET_SR and TARGET_SR != info.samplerate:
+        resampler = StreamResampler(info.samplerate, TARGET_SR, info.frames)
+    # Centre padding as librosa.stft applies it, zeros on both ends
+    carry = np.zeros(N_FFT // 2, np.float32)
+    blocks = sf.blocks(file_path, blocksize=HOP_LENGTH * block_frames, dtype='float32', always_2d=True)
+    for block in blocks:
+        y = block.mean(axis=1, dtype=np.float32)
+        buf = np.concatenate([carry, resampler.process(y) if resampler else y])
+        mag, used = _frames_magnitude(buf, window, scale)
+        if mag is not None:
+            yield mag
+        carry = buf[used:]
+    if resampler:
+        carry = np.concatenate([carry, resampler.process(np.zeros(0), final=True)])
+    mag, _ = _frames_magnitude(np.concatenate([carry, np.zeros(N_FFT // 2, np.float32)]), window, scale)
+    if mag is not None:
+        yield mag
+
+def _frames_magnitude(buf, window, scale):
+    if len(buf) < N_FFT:
+        return None, 0
+    n = 1 + (len(buf) - N_FFT) // HOP_LENGTH
+    frames = np.lib.stride_tricks.sliding_window_view(buf, N_FFT)[::HOP_LENGTH][:n]
+    mag = np.abs(np.fft.rfft(frames * window, axis=1)).astype(np.float32).T * scale
+    return mag, n * HOP_LENGTH
+
+def streaming_spectrogram_db(file_path, max_columns=MAX_COLUMNS, block_frames=BLOCK_FRAMES):
+    """Whole-file dB spectrogram downsampled in time to at most ``max_columns`` columns.
+
+    Consecutive STFT frames are averaged into each column as they stream in, so
+    peak memory depends on ``max_columns`` and the block size, not on duration.
+    """
+    total = stft_frame_count(file_path)
+    pool = max(1, math.ceil(total / max_columns))
+    out = np.zeros((N_FFT // 2 + 1, math.ceil(total / pool)), np.float32)
+    pos = 0
+    for mag in iter_stft(file_path, block_frames):
+        cols, first = np.unique(np.arange(pos, pos + mag.shape[1]) // pool, return_index=True)
+        out[:, cols] += np.add.reduceat(mag, first, axis=1)
+        pos += mag.shape[1]
+    counts = np.bincount(np.arange(pos) // pool, minlength=out.shape[1]).astype(np.float32)
+    out /= np.maximum(counts, 1)
+    return amplitude_to_db(out)
+
+def iter_window_spectrograms(file_path, window_seconds=10.0, min_fraction=0.5,
+                             block_frames=BLOCK_FRAMES):
+    """Yields ``(start_seconds, db)`` for consecutive fixed-length windows.
+
+    Each window is normalised to its own maximum like a standalone clip. A
+    trailing window shorter than ``min_fraction`` of the length is dropped,
+    unless the whole recording is shorter than one window.
+    """
+    sr = audio_length(file_path)[0]
+    width = max(1, int(round(window_seconds * sr / HOP_LENGTH)))
+    buf = np.empty((N_FFT // 2 + 1, width), np.float32)
+    filled = start = 0
+    for mag in iter_stft(file_path, block_frames):
+        i = 0
+        while i < mag.shape[1]:
+            take = min(width - filled, mag.shape[1] - i)
+            buf[:, filled:filled + take] = mag[:, i:i + take]
+            filled += take; i += take
+            if filled == width:
+                yield start * HOP_LENGTH / sr, amplitude_to_db(buf)
+                start += width; filled = 0
+    if filled and (filled >= min_fraction * width or start == 0):
+        yield start * HOP_LENGTH / sr, amplitude_to_db(buf[:, :filled])
+
+def score_windows(file_path, window_seconds=10.0, batch_size=None):
+    """Scores every window of a long recording; returns ``[(start_seconds, match_rate)]``"""
+    starts = []
+
+    def tensors():
+        for start, db in iter_window_spectrograms(file_path, window_seconds):
+            starts.append(start)
+            yield spectrogram_to_tensor(db)
+
+    return [(starts[i], rate) for i, rate in iter_predictions(tensors(), batch_size or DEFAULT_BATCH_SIZE)]
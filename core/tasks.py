@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""QThread-compatible workers that run on the shared scheduler.
+
+``ScheduledTask`` keeps the parts of the ``QThread`` API the UI relies on
+(``start``, ``isRunning``, ``wait``, ``requestInterruption`` ...) but runs
+``run()`` as a ``core.scheduler`` task at the class's ``priority``. Signals
+emitted from the pool thread are queued to receivers on the GUI thread as
+with a real ``QThread``.
+"""
+
+import time
+from concurrent.futures import CancelledError, TimeoutError
+from PyQt5.QtCore import QObject
+
+from core.scheduler import CONVERSION, CancelToken, get_scheduler
+
+class ScheduledTask(QObject):
+    priority = CONVERSION
+
+    def __init__(self, scheduler=None):
+        super().__init__()
+        self.scheduler = scheduler
+        self.token = CancelToken()
+        self.future = None
+
+    def run(self):
+        raise NotImplementedError
+
+    def start(self):
+        scheduler = self.scheduler or get_scheduler()
+        self.future = scheduler.submit(self.run, priority=self.priority, token=self.token)
+        return self.future
+
+    def cancel(self):
+        """Stops the task before it starts, or at its next cancellation check"""
+        self.token.cancel()
+
+    requestInterruption = cancel
+
+    def isInterruptionRequested(self):
+        return self.token.cancelled
+
+    def isRunning(self):
+        return self.future is not None and not self.future.done()
+
+    def wait(self, msecs=None):
+        if self.future is None:
+            return True
+        try:
+            self.future.exception(None if msecs is None else msecs / 1000)
+        except CancelledError:
+            pass
+        except TimeoutError:
+            return False
+        return True
+
+    def yield_to_urgent(self):
+        """Waits while more urgent tasks run; False once this task is cancelled"""
+        return (self.scheduler or get_scheduler()).yield_to(self.priority, self.token)
+
+    @staticmethod
+    def msleep(ms):
+        time.sleep(ms / 1000)
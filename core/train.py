@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+"""Headless retraining of the diagnostic CNN.
+
+    python -m core.train Spectrograms/ --epochs 20 --out models/best_mod.h5
+    python -m core.train shards/ --mixed-precision
+
+The source is either a folder-per-class tree of spectrogram images or
+recordings (labelled by sorted folder name, as in the notebook) or a shard
+directory written by ``core.dataset``. Samples are decoded in a parallel
+``tf.data`` map, cached as uint8 after the first epoch and normalised on the
+fly, so later epochs only pay for the model itself. Shards are already
+memory-mapped uint8, so they are never cached in memory, which keeps datasets
+larger than RAM trainable; ``--cache-file`` still applies to them.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+from core.dataset import INDEX_NAME, SHUFFLE_BUFFER, find_samples, load_index, normalize, prepare_rgb
+from core.inference import DEFAULT_BATCH_SIZE, MODEL_PATH
+from core.network import build_model
+from core.spectrogram import IMG_SIZE
+
+EPOCHS = 20
+VALIDATION_SPLIT = 0.2
+PATIENCE = 4
+
+def split_samples(samples, validation_split, seed=0):
+    """Seeded per-class split, so both subsets keep the class balance"""
+    rng = random.Random(seed)
+    train, valid = [], []
+    for label in sorted({label for _, label in samples}):
+        group = [s for s in samples if s[1] == label]
+        rng.shuffle(group)
+        cut = len(group) - int(round(len(group) * validation_split))
+        train += group[:cut]
+        valid += group[cut:]
+    rng.shuffle(train)
+    return train, valid
+
+def _load_rgb(path):
+    rgb = prepare_rgb(path.decode())
+    if rgb is None:
+        return np.zeros((IMG_SIZE, IMG_SIZE, 3), np.uint8), False
+    return rgb, True
+
+def file_dataset(samples):
+    """Unbatched ``(uint8 image, label)`` dataset decoding files in a parallel map"""
+    import tensorflow as tf
+
+    paths = [p for p, _ in samples]
+    labels = np.asarray([label for _, label in samples], np.int32)
+
+    def load(path, label):
+        rgb, ok = tf.numpy_function(_load_rgb, [path], (tf.uint8, tf.bool))
+        rgb.set_shape((IMG_SIZE, IMG_SIZE, 3))
+        return rgb, label, ok
+
+    def readable(rgb, label, ok):
+        return ok
+
+    def drop_flag(rgb, label, ok):
+        return rgb, label
+
+    dataset = tf.data.Dataset.from_tensor_slices((paths, labels))
+    dataset = dataset.map(load, num_parallel_calls=tf.data.AUTOTUNE, deterministic=False)
+    return dataset.filter(readable).map(drop_flag)
+
+def finish_dataset(dataset, batch_size, shuffle=False, cache=True, seed=None):
+    """cache (uint8) -> shuffle -> normalise -> batch -> prefetch"""
+    import tensorflow as tf
+
+    if cache:
+        dataset = dataset.cache(cache if isinstance(cache, str) else "")
+    if shuffle:
+        dataset = dataset.shuffle(SHUFFLE_BUFFER, seed=seed, reshuffle_each_iteration=True)
+    dataset = dataset.map(normalize, num_parallel_calls=tf.data.AUTOTUNE)
+    return dataset.batch(batch_size).prefetch(tf.data.AUTOTUNE)
+
+def load_datasets(src, batch_size=DEFAULT_BATCH_SIZE, validation_split=VALIDATION_SPLIT,
+                  cache=True, seed=0):
+    """``(train, valid or None, n_train, n_valid)`` for a class tree or shard directory"""
+    from core.dataset import shard_dataset
+
+    if os.path.exists(os.path.join(src, INDEX_NAME)):
+        index = load_index(src)
+        train = shard_dataset(index, False, validation_split, "training", seed)
+        valid = shard_dataset(index, False, validation_split, "validation", seed)
+        counts = [s["count"] for s in index["shards"]]
+        n_valid = sum(c - int(round(c * (1 - validation_split))) for c in counts)
+        n_train = sum(counts) - n_valid
+        # An in-memory cache would hold the whole set in RAM; only a file cache helps here
+        if not isinstance(cache, str):
+            cache = False
+    else:
+        _, samples = find_samples(src)
+        train_samples, valid_samples = split_samples(samples, validation_split, seed)
+        train, valid = file_dataset(train_samples), file_dataset(valid_samples)
+        n_train, n_valid = len(train_samples), len(valid_samples)
+    train_cache = valid_cache = cache
+    if isinstance(cache, str):
+        train_cache, valid_cache = cache + ".train", cache + ".valid"
+    train = finish_dataset(train, batch_size, True, train_cache, seed)
+    valid = finish_dataset(valid, batch_size, False, valid_cache) if n_valid else None
+    return train, valid, n_train, n_valid
+
+def set_precision(enabled):
+    """Turns on mixed precision: float16 on GPU, bfloat16 on CPU (AMX/AVX512-BF16)"""
+    import tensorflow as tf
+    from tensorflow.keras import mixed_precision
+
+    if not enabled:
+        mixed_precision.set_global_policy("float32")
+        return "float32"
+    policy = "mixed_float16" if tf.config.list_physical_devices("GPU") else "mixed_bfloat16"
+    mixed_precision.set_global_policy(policy)
+    return policy
+
+def throughput_logger(n_samples, log=print):
+    """Keras callback recording wall time and samples/s for every epoch"""
+    from tensorflow.keras.callbacks import Callback
+
+    class ThroughputLogger(Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.start = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            seconds = time.perf_counter() - self.start
+            if logs is not None:
+                logs["epoch_seconds"] = seconds
+                logs["samples_per_sec"] = n_samples / seconds if seconds else 0.0
+            log(f"epoch {epoch + 1}: {seconds:.1f} s, {n_samples / seconds:.1f} samples/s")
+
+    return ThroughputLogger()
+
+def train(src, out=MODEL_PATH, epochs=EPOCHS, batch_size=DEFAULT_BATCH_SIZE,
+          validation_split=VALIDATION_SPLIT, mixed_precision=False, cache=True, seed=0, log=print):
+    """Trains the notebook CNN on ``src`` and saves the best weights as a float32 ``out``.
+
+    Returns the Keras history dict, which includes per-epoch throughput.
+    """
+    import tensorflow as tf
+    from tensorflow.keras.callbacks import EarlyStopping, ModelCheckpoint
+
+    tf.keras.utils.set_random_seed(seed)
+    policy = set_precision(mixed_precision)
+    train_ds, valid_ds, n_train, n_valid = load_datasets(src, batch_size, validation_split, cache, seed)
+    if not n_train:
+        raise ValueError(f"No readable training samples under '{src}'.")
+    log(f"{n_train} training / {n_valid} validation samples, policy {policy}")
+
+    monitor = "val_" if valid_ds is not None else ""
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    weights_path = os.path.splitext(out)[0] + ".weights.h5"
+    callbacks = [
+        throughput_logger(n_train, log),
+        ModelCheckpoint(weights_path, monitor=monitor + "accuracy", save_best_only=True,
+                        save_weights_only=True),
+        EarlyStopping(monitor=monitor + "loss", patience=PATIENCE),
+    ]
+    model = build_model()
+    history = model.fit(train_ds, validation_data=valid_ds, epochs=epochs, callbacks=callbacks, verbose=2)
+
+    # Re-save under a float32 policy so inference never inherits the mixed policy
+    set_precision(False)
+    best = build_model()
+    if os.path.exists(weights_path):
+        best.load_weights(weights_path)
+        os.remove(weights_path)
+    else:
+        best.set_weights(model.get_weights())
+    best.save(out)
+    log(f"Saved {out}")
+    return {k: [float(v) for v in vals] for k, vals in history.history.items()}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m core.train", description=__doc__.splitlines()[0])
+    parser.add_argument("src", help="folder-per-class tree or core.dataset shard directory")
+    parser.add_argument("--out", default=MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--validation-split", type=float, default=VALIDATION_SPLIT)
+    parser.add_argument("--mixed-precision", action="store_true",
+                        help="bfloat16 compute on CPU, float16 on GPU")
+    parser.add_argument("--cache-file", default=None,
+                        help="cache decoded samples on disk instead of in memory "
+                             "(the only cache used for shard directories)")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", default=None, help="write the per-epoch history as JSON")
+    args = parser.parse_args(argv)
+    if not os.path.isdir(args.src):
+        parser.error(f"'{args.src}' is not a directory")
+    cache = False if args.no_cache else (args.cache_file or True)
+    history = train(args.src, args.out, args.epochs, args.batch_size, args.validation_split,
+                    args.mixed_precision, cache, args.seed)
+    if args.history:
+        with open(args.history, "w") as f:
+            json.dump(history, f, indent=1)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
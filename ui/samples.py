@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""Sample list shown on the input page.
+
+Rows are plain ``(image, audio)`` entries in a list model painted by a single
+delegate, so a session with thousands of samples costs no widgets per row and
+the view only paints what is visible. A path -> row dict replaces scans over
+the rows, and which sample is playing lives in the model.
+"""
+
+import os
+from PyQt5.QtCore import QAbstractListModel, QModelIndex, QRect, QSize, Qt, QEvent, pyqtSignal
+from PyQt5.QtGui import QColor, QPainter
+from PyQt5.QtWidgets import QStyle, QStyledItemDelegate
+
+ImageRole = Qt.UserRole + 1
+AudioRole = Qt.UserRole + 2
+PlayingRole = Qt.UserRole + 3
+
+class SampleListModel(QAbstractListModel):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.images = []
+        self.audio = []
+        self._rows = {}
+        self.playing = None  # image path of the sample whose audio is playing
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.images)
+
+    def __len__(self):
+        return len(self.images)
+
+    def __contains__(self, img):
+        return img in self._rows
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        img, wav = self.images[index.row()], self.audio[index.row()]
+        if role == Qt.DisplayRole:
+            return os.path.basename(wav or img)
+        if role == Qt.ToolTipRole:
+            return wav or img
+        if role == ImageRole:
+            return img
+        if role == AudioRole:
+            return wav
+        if role == PlayingRole:
+            return img == self.playing
+        return None
+
+    def add(self, img, wav=None):
+        """Appends a sample; returns False if it is already listed"""
+        if img in self._rows:
+            return False
+        row = len(self.images)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.images.append(img); self.audio.append(wav)
+        self._rows[img] = row
+        self.endInsertRows()
+        return True
+
+    def extend(self, samples):
+        """Appends ``(img, wav)`` pairs with a single row insertion"""
+        fresh, seen = [], set(self._rows)
+        for img, wav in samples:
+            if img not in seen:
+                seen.add(img)
+                fresh.append((img, wav))
+        if not fresh:
+            return
+        first = len(self.images)
+        self.beginInsertRows(QModelIndex(), first, first + len(fresh) - 1)
+        for row, (img, wav) in enumerate(fresh, first):
+            self.images.append(img); self.audio.append(wav)
+            self._rows[img] = row
+        self.endInsertRows()
+
+    def row_of(self, img):
+        return self._rows.get(img)
+
+    def sample(self, row):
+        return self.images[row], self.audio[row]
+
+    def remove(self, row):
+        self.beginRemoveRows(QModelIndex(), row, row)
+        img = self.images.pop(row); self.audio.pop(row)
+        del self._rows[img]
+        for r in range(row, len(self.images)):
+            self._rows[self.images[r]] = r
+        if img == self.playing:
+            self.playing = None
+        self.endRemoveRows()
+
+    def clear(self):
+        self.beginResetModel()
+        self.images, self.audio, self._rows, self.playing = [], [], {}, None
+        self.endResetModel()
+
+    def set_playing(self, img):
+        """Marks ``img`` as playing (None: nothing); only the affected rows repaint"""
+        previous, self.playing = self.playing, img
+        for path in {previous, img} - {None}:
+            row = self._rows.get(path)
+            if row is not None:
+                index = self.index(row)
+                self.dataChanged.emit(index, index, [PlayingRole])
+
+class SampleDelegate(QStyledItemDelegate):
+    """Paints a row as ``📄 name  [▶️ Play] [❌]`` and turns clicks into signals"""
+
+    play_clicked = pyqtSignal(int)
+    remove_clicked = pyqtSignal(int)
+
+    ROW_HEIGHT = 38
+    PLAY_WIDTH = 65
+    REMOVE_WIDTH = 28
+    BUTTON_HEIGHT = 28
+    MARGIN = 10
+    SPACING = 6
+
+    def _buttons(self, rect):
+        top = rect.top() + (rect.height() - self.BUTTON_HEIGHT) // 2
+        remove = QRect(rect.right() - self.MARGIN - self.REMOVE_WIDTH, top, self.REMOVE_WIDTH, self.BUTTON_HEIGHT)
+        play = QRect(remove.left() - self.SPACING - self.PLAY_WIDTH, top, self.PLAY_WIDTH, self.BUTTON_HEIGHT)
+        return play, remove
+
+    def sizeHint(self, option, index):
+        return QSize(option.rect.width(), self.ROW_HEIGHT)
+
+    def paint(self, painter, option, index):
+        painter.save()
+        painter.setRenderHint(QPainter.Antialiasing)
+        if option.state & QStyle.State_MouseOver:
+            painter.fillRect(option.rect, QColor("#eef2f7"))
+        play, remove = self._buttons(option.rect)
+        has_audio = bool(index.data(AudioRole))
+
+        text_rect = QRect(option.rect.left() + self.MARGIN, option.rect.top(),
+                          (play if has_audio else remove).left() - self.SPACING - option.rect.left() - self.MARGIN,
+                          option.rect.height())
+        text = option.fontMetrics.elidedText(f"📄 {index.data(Qt.DisplayRole)}", Qt.ElideMiddle, text_rect.width())
+        painter.setPen(QColor("#475569"))
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, text)
+
+        font = painter.font()
+        font.setPointSizeF(max(font.pointSizeF() - 1, 7)); font.setBold(True)
+        painter.setFont(font)
+        painter.setPen(Qt.NoPen)
+        if has_audio:
+            playing = index.data(PlayingRole)
+            painter.setBrush(QColor("#ef4444" if playing else "#10b981"))
+            painter.drawRoundedRect(play, 6, 6)
+            painter.setPen(QColor("white"))
+            painter.drawText(play, Qt.AlignCenter, "⏹️ Stop" if playing else "▶️ Play")
+            painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor("#f1f5f9"))
+        painter.drawRoundedRect(remove, 6, 6)
+        painter.setPen(QColor("#ef4444"))
+        painter.drawText(remove, Qt.AlignCenter, "❌")
+        painter.restore()
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+            play, remove = self._buttons(option.rect)
+            if remove.contains(event.pos()):
+                self.remove_clicked.emit(index.row())
+                return True
+            if index.data(AudioRole) and play.contains(event.pos()):
+                self.play_clicked.emit(index.row())
+                return True
+        return super().editorEvent(event, model, option, index)
@@ -1,17 +1,19 @@
 # -*- coding: utf-8 -*-
 
-import os
+import collections
 from datetime import datetime
 from PyQt5 import QtCore, QtGui, QtWidgets
 from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
                              QLabel, QPushButton, QRadioButton, QButtonGroup, 
                              QFrame, QFileDialog, QCheckBox, QStatusBar,
-                             QScrollArea, QListWidget, QListWidgetItem, QStackedWidget)
+                             QScrollArea, QListView, QListWidget, QListWidgetItem, QStackedWidget)
 from PyQt5.QtCore import Qt, QTimer, QUrl
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
 
-from core.audio import RecordThread, ProcessThread, processing
-from core.model import AnalysisThread, ModelLoaderThread
+from core.audio import RecordThread, processing
+from core.model import AnalysisThread, ModelLoaderThread, SessionBridge
+from core.results import ResultStore
+from ui.samples import SampleDelegate, SampleListModel
 from ui.styles import STYLE_SHEET
 
 class ModernWindow(QMainWindow):
@@ -21,17 +23,42 @@ class ModernWindow(QMainWindow):
         self.setFixedSize(900, 750)
         self.setAcceptDrops(True)
         
-        self.selected_files = []
-        self.original_audio_files = []
+        self.samples = SampleListModel(self)
         self.control = 0
         
         self.player = QMediaPlayer()
+        self.player.stateChanged.connect(self.on_player_state_changed)
+        
+        # Results arrive in bursts from batched inference; the list is refreshed on a timer
+        self.results = ResultStore()
+        self.shown_results = 0
+        self.result_timer = QTimer(self, interval=100)
+        self.result_timer.timeout.connect(self.flush_results)
         
         self.init_ui()
         self.apply_styles()
         
+        # Background work runs as prioritised tasks on the shared core.scheduler pool
+        self.analysis_thread = None
+        self.recorder = None
         self.model_loader = ModelLoaderThread()
+        self.model_loader.report.connect(self.on_model_ready)
+        self.model_loader.error.connect(lambda msg: self.statusBar().showMessage(f"⚠️ Model unavailable: {msg}"))
         self.model_loader.start()
+        
+        # Converts and scores samples in the background as soon as they are added
+        self.session = SessionBridge()
+        # Audio files submitted since the last clear; later conversions are stale
+        self.awaited = collections.Counter()
+        self.session.converted.connect(self.on_converted)
+        self.session.error.connect(lambda msg: self.statusBar().showMessage(f"⚠️ {msg}"))
+        self.session.metrics.connect(self.on_metrics)
+
+    def closeEvent(self, event):
+        self.cancel_analysis()
+        if self.recorder: self.recorder.cancel()
+        self.session.close()
+        super().closeEvent(event)
 
     def dragEnterEvent(self, event):
         if event.mimeData().hasUrls() and self.stack.currentIndex() == 1:
@@ -125,7 +152,14 @@ class ModernWindow(QMainWindow):
         self.record_progress = QtWidgets.QProgressBar(objectName="recordProgress", visible=False)
         p2_layout.addWidget(self.record_progress)
         
-        self.file_list_display = QListWidget(objectName="fileListDisplay", minimumHeight=150)
+        self.file_list_display = QListView(objectName="fileListDisplay", minimumHeight=150)
+        self.file_list_display.setModel(self.samples)
+        self.file_list_display.setUniformItemSizes(True)
+        self.file_list_display.setMouseTracking(True)
+        self.sample_delegate = SampleDelegate(self.file_list_display)
+        self.sample_delegate.play_clicked.connect(self.toggle_play)
+        self.sample_delegate.remove_clicked.connect(self.remove_specific_file)
+        self.file_list_display.setItemDelegate(self.sample_delegate)
         self.file_list_display.hide()
         p2_layout.addWidget(self.file_list_display)
         
@@ -164,6 +198,9 @@ class ModernWindow(QMainWindow):
         self.res_list = QListWidget(objectName="resList", maximumHeight=200)
         p3_layout.addWidget(self.res_list)
         p3_layout.addStretch()
+        self.btn_export = QPushButton("💾 Export Results", objectName="secondaryBtn", visible=False)
+        self.btn_export.clicked.connect(self.export_results)
+        p3_layout.addWidget(self.btn_export)
         self.btn_reset = QPushButton("🔄 Start New Diagnostic", objectName="mainBtn", visible=False)
         self.btn_reset.clicked.connect(self.reset_all)
         p3_layout.addWidget(self.btn_reset)
@@ -178,18 +215,36 @@ class ModernWindow(QMainWindow):
         self.rate_label.setText("--")
         self.rate_label.setStyleSheet("color: #94a3b8; font-size: 80px; font-weight: 800;")
         self.res_list.clear()
-        self.btn_reset.hide()
-        self.analysis_thread = AnalysisThread(self.selected_files)
+        self.btn_reset.hide(); self.btn_export.hide()
+        self.results.clear(); self.results.start(); self.shown_results = 0
+        self.result_timer.start()
+        self.cancel_analysis()
+        self.analysis_thread = AnalysisThread(list(self.samples.images), scores=self.session.results)
         self.analysis_thread.result_ready.connect(self.on_analysis_result)
         self.analysis_thread.finished.connect(self.on_analysis_finished)
+        self.analysis_thread.metrics.connect(self.on_metrics)
         self.analysis_thread.start()
 
+    def cancel_analysis(self):
+        """Stops a previous analysis and drops any of its signals still in flight"""
+        if self.analysis_thread is None:
+            return
+        self.analysis_thread.cancel()
+        for signal in (self.analysis_thread.result_ready, self.analysis_thread.finished, self.analysis_thread.metrics):
+            signal.disconnect()
+        self.analysis_thread = None
+
     def handle_record(self):
         self.btn_record.setEnabled(False); self.btn_browse.setEnabled(False)
         self.record_progress.show(); self.record_timer_label.show()
+        self.live_rate = None
         self.recorder = RecordThread(datetime.now().strftime("%H-%M-%S"))
         self.recorder.progress.connect(self.update_record_ui)
+        self.recorder.live_score.connect(self.on_live_score)
+        self.recorder.live_unavailable.connect(
+            lambda msg: self.statusBar().showMessage(f"⚠️ No live score: {msg}"))
         self.recorder.finished.connect(self.on_record_finished)
+        self.recorder.error.connect(self.on_record_error)
         self.recorder.start()
 
     def handle_browse(self):
@@ -205,113 +260,122 @@ class ModernWindow(QMainWindow):
         
         if audio_files:
             self.statusBar().showMessage(f"Processing {len(audio_files)} audio files...")
-            self.process_thread = ProcessThread(audio_files)
-            self.process_thread.finished.connect(self.add_file_to_selection)
-            self.process_thread.finished.connect(self.update_file_visibility)
-            self.process_thread.start()
+            self.awaited.update(audio_files)
+            self.session.submit(audio_files)
         
         if img_files:
-            for f in img_files: self.add_file_to_selection(f, None)
+            self.samples.extend((f, None) for f in img_files)
+            self.session.prescore(img_files)
             self.update_file_visibility()
 
     def update_record_ui(self, v):
         self.record_progress.setValue(v)
-        self.record_timer_label.setText(f"Recording: {max(0, 3.0-(v*0.03)):.1f}s")
+        seconds = self.recorder.seconds
+        live = f"  ·  live %{self.live_rate:.1f}" if self.live_rate is not None else ""
+        self.record_timer_label.setText(f"Recording: {max(0, seconds - v * seconds / 100):.1f}s{live}")
+
+    def on_live_score(self, t, rate):
+        self.live_rate = rate
+
+    def on_record_error(self, msg):
+        self.statusBar().showMessage(f"⚠️ Recording failed: {msg}")
+        self.record_progress.hide(); self.record_timer_label.hide()
+        self.btn_record.setEnabled(True); self.btn_browse.setEnabled(True)
 
     def on_record_finished(self, img, wav):
+        self.session.prescore([img])
         self.add_file_to_selection(img, wav); self.record_progress.hide(); self.record_timer_label.hide()
         self.btn_record.setEnabled(True); self.btn_browse.setEnabled(True)
         self.update_file_visibility()
 
+    def on_converted(self, img, wav):
+        if self.awaited[wav] <= 0:
+            return
+        self.awaited[wav] -= 1
+        self.add_file_to_selection(img, wav)
+        self.update_file_visibility()
+
     def add_file_to_selection(self, img, wav):
-        self.selected_files.append(img); self.original_audio_files.append(wav)
-        item = QListWidgetItem(self.file_list_display)
-        widget = QWidget()
-        layout = QHBoxLayout(widget)
-        layout.setContentsMargins(10, 5, 10, 5)
-        filename = os.path.basename(img if not wav else wav)
-        layout.addWidget(QLabel(f"📄 {filename[:30]}..."))
-        layout.addStretch()
-        if wav:
-            btn = QPushButton("▶️ Play")
-            btn.setFixedSize(65, 28)
-            btn.setCursor(Qt.PointingHandCursor)
-            btn.setStyleSheet("background:#10b981; color:white; border-radius:6px; font-size:11px; font-weight:700;")
-            
-            def toggle_play(_, p=wav, b=btn):
-                if self.player.state() == QMediaPlayer.PlayingState and self.player.currentMedia().canonicalUrl().toLocalFile() == p:
-                    self.player.stop()
-                    b.setText("▶️ Play")
-                    b.setStyleSheet("background:#10b981; color:white; border-radius:6px; font-size:11px; font-weight:700;")
-                else:
-                    self.play_audio(p)
-                    for i in range(self.file_list_display.count()):
-                        other_item = self.file_list_display.item(i)
-                        other_widget = self.file_list_display.itemWidget(other_item)
-                        if other_widget:
-                            other_btn = other_widget.findChild(QPushButton)
-                            if other_btn and other_btn.text() == "⏹️ Stop":
-                                other_btn.setText("▶️ Play")
-                                other_btn.setStyleSheet("background:#10b981; color:white; border-radius:6px; font-size:11px; font-weight:700;")
-                    b.setText("⏹️ Stop")
-                    b.setStyleSheet("background:#ef4444; color:white; border-radius:6px; font-size:11px; font-weight:700;")
-            
-            btn.clicked.connect(toggle_play)
-            layout.addWidget(btn)
-            
-        rm_btn = QPushButton("❌")
-        rm_btn.setFixedSize(28, 28)
-        rm_btn.setCursor(Qt.PointingHandCursor)
-        rm_btn.setStyleSheet("background:#f1f5f9; color:#ef4444; border-radius:6px; font-weight:800;")
-        rm_btn.clicked.connect(lambda: self.remove_specific_file(item, img, wav))
-        layout.addWidget(rm_btn)
-        item.setSizeHint(widget.sizeHint()); self.file_list_display.setItemWidget(item, widget)
-
-    def remove_specific_file(self, item, img, wav):
-        self.file_list_display.takeItem(self.file_list_display.row(item))
-        idx = self.selected_files.index(img)
-        self.selected_files.pop(idx); self.original_audio_files.pop(idx)
+        self.samples.add(img, wav)
+
+    def toggle_play(self, row):
+        img, wav = self.samples.sample(row)
+        if self.samples.playing == img:
+            self.player.stop()
+            self.samples.set_playing(None)
+        else:
+            self.play_audio(wav)
+            self.samples.set_playing(img)
+
+    def remove_specific_file(self, row):
+        if self.samples.playing == self.samples.sample(row)[0]:
+            self.player.stop()
+        self.samples.remove(row)
         self.update_file_visibility()
 
     def play_audio(self, p):
         self.player.setMedia(QMediaContent(QUrl.fromLocalFile(p)))
         self.player.play()
-        self.player.stateChanged.connect(self.on_player_state_changed)
 
     def on_player_state_changed(self, state):
         if state == QMediaPlayer.StoppedState:
-            for i in range(self.file_list_display.count()):
-                item = self.file_list_display.item(i)
-                widget = self.file_list_display.itemWidget(item)
-                if widget:
-                    btn = widget.findChild(QPushButton)
-                    if btn and btn.text() == "⏹️ Stop":
-                        btn.setText("▶️ Play")
-                        btn.setStyleSheet("background:#10b981; color:white; border-radius:6px; font-size:11px; font-weight:700;")
-    
+            self.samples.set_playing(None)
+
     def update_file_visibility(self):
-        has_files = len(self.selected_files) > 0
+        has_files = len(self.samples) > 0
         self.file_list_display.setVisible(has_files); self.btn_clear_files.setVisible(has_files)
         self.btn_next2.setEnabled(has_files)
-        self.file_info.setText(f"✅ {len(self.selected_files)} sample(s) ready." if has_files else "Drag & Drop or use buttons above.")
+        self.file_info.setText(f"✅ {len(self.samples)} sample(s) ready." if has_files else "Drag & Drop or use buttons above.")
 
     def on_analysis_result(self, i, path, rate):
-        total_prev = sum([float(self.res_list.item(j).text().split('%')[1].split(' ')[0]) for j in range(self.res_list.count())])
-        avg = (total_prev + rate) / (self.res_list.count() + 1)
+        self.results.add(i, path, rate)
+
+    def flush_results(self):
+        if self.shown_results == len(self.results):
+            return
+        self.res_list.setUpdatesEnabled(False)
+        for i, _, rate, _ in self.results.rows(self.shown_results):
+            item = QListWidgetItem(f"✅ Sample {i+1}: %{rate:.2f}")
+            item.setForeground(QtGui.QColor('#ef4444' if rate > 50 else '#10b981'))
+            self.res_list.addItem(item)
+        self.res_list.setUpdatesEnabled(True)
+        self.shown_results = len(self.results)
+        avg = self.results.mean
         self.rate_label.setText(f"%{avg:.2f}")
         self.rate_label.setStyleSheet(f"color: {'#ef4444' if avg > 50 else '#10b981'}; font-size:80px; font-weight:800;")
-        item = QListWidgetItem(f"✅ Sample {i+1}: %{rate:.2f}")
-        item.setForeground(QtGui.QColor('#ef4444' if rate > 50 else '#10b981'))
-        self.res_list.addItem(item); self.res_list.scrollToBottom()
+        self.res_list.scrollToBottom()
+
+    def on_analysis_finished(self):
+        self.result_timer.stop(); self.flush_results()
+        r = self.results
+        detail = f" {len(r)} samples · range %{r.min:.2f}–%{r.max:.2f} · σ {r.std:.2f}" if len(r) else ""
+        self.status_label.setText(f"✨ Analysis complete.{detail}")
+        self.btn_reset.show(); self.btn_export.setVisible(len(r) > 0)
+
+    def on_model_ready(self, stats):
+        self.statusBar().showMessage(
+            f"Model ready ({stats['backend']}): loaded in {stats['load_s']:.1f} s, "
+            f"warmed up in {stats['warmup_s']:.1f} s", 5000)
+
+    def on_metrics(self, snap):
+        stages = "  ".join(f"{name} {t['mean_ms']:.0f} ms" for name, t in sorted(snap["timers"].items()))
+        self.statusBar().showMessage(f"⏱️ {stages}")
+
+    def export_results(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Results", "results.csv", "CSV (*.csv);;JSON (*.json)")
+        if path:
+            self.results.export(path)
+            self.statusBar().showMessage(f"Results saved to {path}")
 
-    def on_analysis_finished(self): self.status_label.setText("✨ Analysis complete."); self.btn_reset.show()
     def clear_file_selection(self):
-        self.selected_files = []; self.original_audio_files = []
-        self.file_list_display.clear(); self.update_file_visibility(); self.player.stop()
+        self.session.cancel(); self.awaited.clear()
+        self.player.stop(); self.samples.clear(); self.update_file_visibility()
     
     def reset_all(self):
+        self.cancel_analysis()
         self.clear_file_selection()
-        self.res_list.clear()
+        self.result_timer.stop(); self.results.clear(); self.shown_results = 0
+        self.res_list.clear(); self.btn_export.hide()
         self.rate_label.setText("--")
         self.rate_label.setStyleSheet("color: #94a3b8; font-size: 80px; font-weight: 800;")
         self.status_label.setText("Preparing...")